@@ -0,0 +1,218 @@
+"""Random access to whole recordings for post-session analysis.
+
+A recording can be far larger than the live buffer, so nothing is decoded up
+front. Opening one only maps its parts and reads their block indexes (see
+session.py). After that, a view of the recording is served in one of two ways:
+
+- Narrow windows, covering at most `decodeBlocks` index blocks, decode those
+  blocks in full. Decoded blocks are kept in a small LRU cache.
+- Wider windows are drawn from a per-block min/max overview. A background
+  thread builds it, and it is saved next to the recording so later opens can
+  use it straight away. Blocks the overview has not reached yet show the
+  first sample of the block instead.
+"""
+import bisect
+import math
+import time
+from collections import OrderedDict
+from threading import Thread
+
+import numpy as np
+
+import session
+
+class AnalysisSource():
+    """A recording opened for analysis, with the window currently being looked at.
+
+    `makeParser()` returns a function mapping (rxTime, raw line) to a schema row or None.
+    Each thread that decodes gets its own, so stateful parsing steps such as
+    windowed derived channels do not interleave; they restart at every decoded
+    block.
+    """
+    def __init__(self, path, schema, makeParser, decodeBlocks=8, cacheBlocks=64, overview=True):
+        self.schema = schema
+        self.makeParser = makeParser
+        self.parse = makeParser()
+        self.decodeBlocks = decodeBlocks
+        self.cacheBlocks = cacheBlocks
+        parts = session.sessionParts(path) or [path]
+        self.readers = [session.SessionReader(p, saveIndex=True) for p in parts]
+        # Every index block of every part: reader, start and end offset, first receive time
+        readers, starts, ends, times = [], [], [], []
+        for n, reader in enumerate(self.readers):
+            entries = np.frombuffer(reader.index, dtype=[("time", "<f8"), ("offset", "<u8")])
+            if not len(entries):
+                continue
+            readers.append(np.full(len(entries), n))
+            starts.append(entries["offset"])
+            ends.append(np.append(entries["offset"][1:], reader.end))
+            times.append(entries["time"])
+        if not times:
+            self.close()
+            raise ValueError(f"{path} has no records")
+        self.blockReader = np.concatenate(readers)
+        self.blockStart = np.concatenate(starts)
+        self.blockEnd = np.concatenate(ends)
+        self.blockTimes = np.concatenate(times)
+        self.startTime = float(self.blockTimes[0])
+        self.endTime = self.readers[-1].endTime() or self.startTime
+        self.view = (self.startTime, self.endTime)
+        self.cachePath = (parts[0][:-4] if parts[0].endswith(".rec") else parts[0]) + ".ovw.npz"
+
+        blocks = len(self.blockTimes)
+        # Per field column index: min/max of every block, NaN until built
+        self.mins = {}
+        self.maxs = {}
+        self.built = np.zeros(blocks, dtype=bool)
+        self.samples = {}
+        self.sampled = np.zeros(blocks, dtype=bool)
+        self.decoded = OrderedDict()
+        self.stopped = False
+        self.overviewThread = None
+        if not self._loadOverview() and overview:
+            self.overviewThread = Thread(target=self._buildOverview, daemon=True)
+            self.overviewThread.start()
+
+    def close(self):
+        self.stopped = True
+        if self.overviewThread:
+            self.overviewThread.join()
+        for reader in self.readers:
+            reader.close()
+
+    def progress(self):
+        """Fraction of blocks the overview covers
+        """
+        return float(self.built.mean())
+
+    def setView(self, start, span):
+        start = min(max(start, self.startTime), max(self.endTime - span, self.startTime))
+        self.view = (start, start + span)
+
+    def _column(self, store, idx):
+        column = store.get(idx)
+        if column is None:
+            column = store.setdefault(idx, np.full(len(self.blockTimes), np.nan))
+        return column
+
+    def _decode(self, block, parse, yieldEvery=None):
+        """(times, rows matrix) of every parsable record in a block.
+
+        With `yieldEvery`, the GIL is given up after that many records, so a
+        background decode never holds up the UI thread for long.
+        """
+        reader = self.readers[self.blockReader[block]]
+        times = []
+        rows = []
+        for n, (rxTime, line, _) in enumerate(reader.records(int(self.blockStart[block]), int(self.blockEnd[block]))):
+            if yieldEvery and n % yieldEvery == 0:
+                time.sleep(0)
+            row = parse(rxTime, line)
+            if row:
+                times.append(rxTime)
+                rows.append(row)
+        matrix = np.full((len(rows), max((len(row) for row in rows), default=0)), np.nan)
+        for i, row in enumerate(rows):
+            matrix[i, :len(row)] = row
+        return np.array(times), matrix
+
+    def _decoded(self, block):
+        result = self.decoded.get(block)
+        if result is None:
+            result = self.decoded[block] = self._decode(block, self.parse)
+            if len(self.decoded) > self.cacheBlocks:
+                self.decoded.popitem(last=False)
+        else:
+            self.decoded.move_to_end(block)
+        return result
+
+    def _sample(self, block):
+        """Decode just the first parsable record of a block into self.samples
+        """
+        reader = self.readers[self.blockReader[block]]
+        for rxTime, line, _ in reader.records(int(self.blockStart[block]), int(self.blockEnd[block])):
+            row = self.parse(rxTime, line)
+            if row:
+                for idx, value in enumerate(row):
+                    self._column(self.samples, idx)[block] = value
+                break
+        self.sampled[block] = True
+
+    def _buildOverview(self):
+        parse = self.makeParser()
+        for block in range(len(self.blockTimes)):
+            if self.stopped:
+                return
+            _, matrix = self._decode(block, parse, yieldEvery=50)
+            if len(matrix):
+                # fmin/fmax skip NaN, an all NaN column stays NaN
+                lows = np.fmin.reduce(matrix, axis=0)
+                highs = np.fmax.reduce(matrix, axis=0)
+                for idx in range(matrix.shape[1]):
+                    self._column(self.mins, idx)[block] = lows[idx]
+                    self._column(self.maxs, idx)[block] = highs[idx]
+            self.built[block] = True
+        self._saveOverview()
+
+    def _saveOverview(self):
+        arrays = {"blockTimes": self.blockTimes}
+        for idx, column in list(self.mins.items()):
+            name = self.schema.names[idx]
+            arrays["min:" + name] = column
+            arrays["max:" + name] = self._column(self.maxs, idx)
+        try:
+            with open(self.cachePath, "wb") as f:
+                np.savez(f, **arrays)
+        except OSError:
+            pass
+
+    def _loadOverview(self):
+        try:
+            cache = np.load(self.cachePath)
+        except (OSError, ValueError):
+            return False
+        with cache:
+            # A recording that grew since, or a different one under the same name, needs a new overview
+            if not np.array_equal(cache["blockTimes"], self.blockTimes):
+                return False
+            for key in cache.files:
+                kind, _, name = key.partition(":")
+                if kind in ("min", "max"):
+                    idx = self.schema.indexOf(name)
+                    (self.mins if kind == "min" else self.maxs)[idx] = cache[key]
+        self.built[:] = True
+        return True
+
+    def getView(self, key, start, end, buckets):
+        """Get (times, values) of `key` between start and end (ms).
+
+        Wide windows come back as a min/max envelope of at most `buckets` groups of
+        blocks, narrow ones as raw samples for the caller to decimate.
+        """
+        idx = self.schema.index.get(key)
+        first = max(bisect.bisect_right(self.blockTimes, start) - 1, 0)
+        last = bisect.bisect_left(self.blockTimes, end)
+        if idx is None or last <= first:
+            return np.empty(0), np.empty(0)
+        if last - first <= self.decodeBlocks:
+            parts = [self._decoded(block) for block in range(first, last)]
+            times = np.concatenate([t for t, _ in parts])
+            values = np.concatenate([m[:, idx] if idx < m.shape[1] else np.full(len(t), np.nan) for t, m in parts])
+            inside = (times >= start) & (times <= end)
+            return times[inside], values[inside]
+        # Group blocks so there are at most `buckets` groups
+        stride = max(math.ceil((last - first) / buckets), 1)
+        groups = np.arange(first, last, stride)
+        lows = np.fmin.reduceat(self._column(self.mins, idx)[first:last], groups - first)
+        highs = np.fmax.reduceat(self._column(self.maxs, idx)[first:last], groups - first)
+        for n, block in enumerate(groups):
+            if lows[n] != lows[n] and not self.built[block]:
+                # Not in the overview yet, show the block's first sample
+                if not self.sampled[block]:
+                    self._sample(block)
+                lows[n] = highs[n] = self._column(self.samples, idx)[block]
+        outTimes = np.repeat(self.blockTimes[groups], 2)
+        outValues = np.empty(len(outTimes))
+        outValues[0::2] = lows
+        outValues[1::2] = highs
+        return outTimes, outValues
@@ -0,0 +1,983 @@
+"""Benchmarks for the field-side pipeline, run headless on the Agg backend.
+
+Usage: python bench.py {pipeline,draw,serial,parse,frame,record,tiles,track,laps,derived,analysis,sources,fanout,overview,diagnostics,export,all} [--json results.json]
+
+Every benchmark prints a table and returns its numbers, which --json writes out
+together with the current git commit so runs can be compared between commits.
+"""
+import analysis
+import argparse
+import http.server
+import io
+import json
+import math
+import os
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tkinter as tk
+import tracemalloc
+
+import numpy as np
+import serial
+from PIL import Image
+from tkintermapview.utility_functions import decimal_to_osm
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import derived
+import diagnostics
+import export
+import fanout
+import gendummy
+import laps
+import main
+import session
+import telemframe
+import tilecache
+import track
+
+def fillBuffer(buffer, count, delay=gendummy.delay):
+    """Fill a buffer with `count` dummy packets ending now, spaced `delay` ms apart
+    """
+    now = time.time() * 1000
+    for n in range(count):
+        buffer.add(gendummy.getDummyData(), now - (count - n) * delay)
+
+def timeIt(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def benchDraw(args):
+    buffer = main.RollingBuffer(main.maxBufferLength)
+    fillBuffer(buffer, main.maxBufferLength)
+    fields = ["RPM", "Throttle", "Speed", "BV"]
+    results = []
+    print(f"{'window':>6} {'decimate':>8} {'full ms':>9} {'blit ms':>9}")
+    for label in main.timeOptionLabels:
+        for decimate in (False, True):
+            figure = Figure(figsize=(6.4, 4.8), dpi=100, layout="tight")
+            renderer = main.GraphRenderer(figure, FigureCanvasAgg(figure), buffer)
+            renderer.fields = fields
+            renderer.limit = label
+            renderer.decimate = decimate
+            renderer.draw()
+            def full():
+                renderer.invalidate()
+                renderer.draw()
+            fullMs = timeIt(full, args.iterations)
+            blitMs = timeIt(renderer.draw, args.iterations)
+            print(f"{label:>6} {str(decimate):>8} {fullMs:9.2f} {blitMs:9.2f}")
+            results.append({"window": label, "decimate": decimate, "fullMs": fullMs, "blitMs": blitMs})
+    return results
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def fakeModem(fd, rate, duration, sentTimes):
+    """Write +RCV= wrapped TELEM lines to a pty master at `rate` packets per second
+    """
+    start = time.perf_counter()
+    n = 0
+    while n / rate < duration:
+        delay = start + n / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        payload = gendummy.pack(gendummy.getDummyData()).strip()
+        line = f"+RCV={main.carLoraAddress},{len(payload)},{payload},-40,12\r\n".encode()
+        sentTimes[gendummy.i] = time.time() * 1000
+        os.write(fd, line)
+        n += 1
+
+def readlineReader(port, received):
+    """The original reader loop: one readline(timeout=1) call per packet
+    """
+    s = serial.Serial(port, baudrate=main.baudrate, timeout=1)
+    while main.running:
+        data = s.readline()
+        if not data:
+            continue
+        rxTime = time.time() * 1000
+        pkt = main.parseLoraPacket(data.decode())
+        received.append((rxTime, data, pkt))
+    s.close()
+
+def chunkedReader(port, received):
+    main.mainSchema = main.FieldSchema(main.expectedFields)
+    main.sources = {}
+    main.configureSources({"Car": {"port": port, "address": None}})
+    reader = main.AsyncSerial(port)
+    reader.s = serial.Serial(port, baudrate=main.baudrate)
+    reader.run()
+    received.extend(item[:3] for item in main.sources["Car"].queue.drain())
+
+def benchSerial(args):
+    readers = {"readline": readlineReader, "chunked": chunkedReader}
+    seqPattern = re.compile(rb"TELEM([0-9]+)")
+    results = []
+    print(f"{'reader':>8} {'rate':>5} {'recv':>6} {'lost':>5} {'p50 ms':>7} {'p99 ms':>7} {'cpu %':>6} {'stop ms':>8}")
+    for rate in (20, 200, 2000):
+        for name, reader in readers.items():
+            master, slave = os.openpty()
+            sentTimes = {}
+            received = []
+            main.running = True
+            thread = threading.Thread(target=reader, args=(os.ttyname(slave), received))
+            thread.start()
+            time.sleep(0.2)
+            cpuStart = time.process_time()
+            fakeModem(master, rate, args.duration, sentTimes)
+            time.sleep(0.1)
+            cpu = (time.process_time() - cpuStart) / (args.duration + 0.1) * 100
+            stopStart = time.perf_counter()
+            main.running = False
+            thread.join()
+            stopMs = (time.perf_counter() - stopStart) * 1000
+            os.close(master)
+            os.close(slave)
+            latencies = []
+            for rxTime, data, pkt in received:
+                match = seqPattern.search(data)
+                if match and int(match[1]) in sentTimes:
+                    latencies.append(rxTime - sentTimes[int(match[1])])
+            lost = len(sentTimes) - len(latencies)
+            print(f"{name:>8} {rate:>5} {len(latencies):>6} {lost:>5} {percentile(latencies, 50):7.2f} "
+                  f"{percentile(latencies, 99):7.2f} {cpu:6.1f} {stopMs:8.1f}")
+            results.append({"reader": name, "rate": rate, "received": len(latencies), "lost": lost,
+                            "p50Ms": percentile(latencies, 50), "p99Ms": percentile(latencies, 99),
+                            "cpuPercent": cpu, "stopMs": stopMs})
+    return results
+
+def sourceModem(fd, address, rate, duration, sentTimes):
+    """fakeModem for one of several cars, numbering its own packets so concurrent modems do not share gendummy's counter
+    """
+    start = time.perf_counter()
+    n = 0
+    while n / rate < duration:
+        delay = start + n / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        payload = b"TELEM%d;RPM=%.2f;Speed=%.2f;LAT=3947.6000;LON=8614.1000;BV=12.10" % (n, n % 1800, n % 30)
+        sentTimes[n] = time.time() * 1000
+        os.write(fd, b"+RCV=%d,%d,%s,-40,12\r\n" % (address, len(payload), payload))
+        n += 1
+
+def benchSources(args):
+    """Several cars on their own ports, each with its own reader thread, drained every ingestDrainDelay like the UI does.
+
+    The last run adds a port flooding at 5 kHz to show it does not hold up the other sources.
+    """
+    seqPattern = re.compile(rb"TELEM([0-9]+)")
+    runs = [(1, 200, 0), (2, 200, 0), (4, 200, 0), (2, 200, 5000)]
+    results = []
+    print(f"{'cars':>4} {'rate':>5} {'flood':>6} {'recv':>6} {'lost':>5} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'flood recv':>10} {'flood drop':>10} {'cpu %':>6}")
+    for cars, rate, flood in runs:
+        main.mainSchema = main.FieldSchema(main.expectedFields)
+        main.sources = {}
+        ptys = []
+        config = {}
+        modems = []
+        for n in range(cars + (1 if flood else 0)):
+            master, slave = os.openpty()
+            ptys.append((master, slave))
+            name = f"Car{n}" if n < cars else "Flood"
+            config[name] = {"port": os.ttyname(slave), "address": 101 + n}
+            modems.append((name, master, 101 + n, rate if n < cars else flood, {}))
+        main.configureSources(config)
+        main.running = True
+        readers = []
+        for c in config.values():
+            reader = main.AsyncSerial(c["port"])
+            reader.s = serial.Serial(c["port"], baudrate=main.baudrate)
+            reader.start()
+            readers.append(reader)
+        latencies = {name: [] for name in config}
+        counts = {name: 0 for name in config}
+        done = threading.Event()
+        def drain():
+            while not done.is_set():
+                time.sleep(main.ingestDrainDelay / 1000)
+                now = time.time() * 1000
+                for source in list(main.sources.values()):
+                    sent = next(m[4] for m in modems if m[0] == source.name)
+                    for rxTime, data, row, _ in source.queue.drain():
+                        counts[source.name] += 1
+                        if row:
+                            source.apply(rxTime, row)
+                        match = seqPattern.search(data)
+                        if match and int(match[1]) in sent:
+                            latencies[source.name].append(now - sent[int(match[1])])
+        drainer = threading.Thread(target=drain)
+        drainer.start()
+        cpuStart = time.process_time()
+        threads = [threading.Thread(target=sourceModem, args=(master, address, r, args.duration, sent))
+                   for _, master, address, r, sent in modems]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(0.2)
+        cpu = (time.process_time() - cpuStart) / (args.duration + 0.2) * 100
+        done.set()
+        drainer.join()
+        main.running = False
+        for reader in readers:
+            reader.join()
+        for master, slave in ptys:
+            os.close(master)
+            os.close(slave)
+        carNames = [name for name in config if name != "Flood"]
+        carLatencies = [ms for name in carNames for ms in latencies[name]]
+        sent = sum(len(m[4]) for m in modems if m[0] != "Flood")
+        lost = sent - len(carLatencies)
+        floodSent = sum(len(m[4]) for m in modems if m[0] == "Flood")
+        floodDropped = main.sources["Flood"].queue.dropped if flood else 0
+        print(f"{cars:>4} {rate:>5} {flood:>6} {len(carLatencies):>6} {lost:>5} {percentile(carLatencies, 50):7.2f} "
+              f"{percentile(carLatencies, 99):7.2f} {counts.get('Flood', 0):>10} {floodDropped:>10} {cpu:6.1f}")
+        results.append({"cars": cars, "rate": rate, "flood": flood, "received": len(carLatencies), "lost": lost,
+                        "p50Ms": percentile(carLatencies, 50), "p99Ms": percentile(carLatencies, 99),
+                        "floodSent": floodSent, "floodReceived": counts.get("Flood", 0),
+                        "floodDropped": floodDropped, "cpuPercent": cpu})
+    return results
+
+def benchFanout(args):
+    """Publish to 1, 5 and 20 subscriber processes on localhost, plus one connection that never reads.
+
+    "max" publishes as fast as the loop goes, "paced" one batch per ingest tick
+    per car for 4 cars. Each subscriber is `python fanout.py` in its own process.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    fields = [gendummy.fieldName(n) for n in range(args.fields)]
+    batchRows = 4
+    results = []
+    print(f"{'subs':>4} {'mode':>6} {'batches/s':>10} {'sent/s':>9} {'recv/s min':>10} {'recv %':>7} "
+          f"{'p50 ms':>7} {'p99 ms':>8} {'pub p50 us':>10} {'pub p99 us':>10} {'stalled drop':>12}")
+    for subscribers in (1, 5, 20):
+        for mode in ("max", "paced"):
+            publisher = fanout.Publisher("127.0.0.1", 0, main.publishQueueSize)
+            publisher.start()
+            url = f"tcp://127.0.0.1:{publisher.port}"
+            watchers = [subprocess.Popen([sys.executable, "fanout.py", url, str(args.duration + 5), "--json"], cwd=here,
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                        for _ in range(subscribers)]
+            stalled = socket.socket()
+            stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            stalled.connect(("127.0.0.1", publisher.port))
+            deadline = time.monotonic() + 30
+            while len(publisher.subscribers()) < subscribers + 1 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            publishUs = []
+            batches = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < args.duration:
+                if mode == "paced":
+                    delay = start + batches / (4 * 1000 / main.ingestDrainDelay) - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                now = time.time() * 1000
+                rows = [[math.sin(batches + n + i) for i in range(len(fields))] for n in range(batchRows)]
+                times = [now - (batchRows - 1 - n) * gendummy.delay for n in range(batchRows)]
+                t0 = time.perf_counter_ns()
+                publisher.publish(f"Car{batches % 4}", fields, times, rows)
+                publishUs.append((time.perf_counter_ns() - t0) / 1000)
+                batches += 1
+            elapsed = time.perf_counter() - start
+            stalledClient = next((c for c in publisher.subscribers() if c.address == stalled.getsockname()), None)
+            stalledDropped = stalledClient.dropped if stalledClient else None
+            # Let the subscribers drain what is queued before closing
+            time.sleep(1)
+            publisher.close()
+            stalled.close()
+            reports = []
+            for watcher in watchers:
+                out, _ = watcher.communicate()
+                reports.append(json.loads(out.strip().splitlines()[-1]))
+            received = min(r["batches"] for r in reports)
+            result = {"subscribers": subscribers, "mode": mode, "batchesPerSecond": batches / elapsed,
+                      "samplesPerSecond": batches * batchRows / elapsed,
+                      "minReceivedPerSecond": received * batchRows / elapsed,
+                      "receivedPercent": received / batches * 100,
+                      "p50Ms": max(r["p50Ms"] for r in reports), "p99Ms": max(r["p99Ms"] for r in reports),
+                      "publishP50Us": percentile(publishUs, 50), "publishP99Us": percentile(publishUs, 99),
+                      "stalledDropped": stalledDropped}
+            print(f"{subscribers:>4} {mode:>6} {result['batchesPerSecond']:10.0f} {result['samplesPerSecond']:9.0f} "
+                  f"{result['minReceivedPerSecond']:10.0f} {result['receivedPercent']:7.1f} {result['p50Ms']:7.1f} "
+                  f"{result['p99Ms']:8.1f} {result['publishP50Us']:10.1f} {result['publishP99Us']:10.1f} "
+                  f"{str(stalledDropped):>12}")
+            results.append(result)
+    return results
+
+def legacyOverviewDraw(buffer, key, stats, variables):
+    """StatOverview.draw as it was before dirty tracking: format and set all four variables every call
+    """
+    fstr = '{:9.2f}'
+    variables[0].set('{:9.2f}{:s}'.format(buffer.getLast(key) or 0, main.fieldUnits.get(key) or ""))
+    variables[1].set(fstr.format(stats.getMin(key) or 0))
+    variables[2].set('({:9.2f})'.format(stats.getAvg(key) or 0))
+    variables[3].set(fstr.format(stats.getMax(key) or 0))
+
+def benchOverview(args):
+    """Stat overview refresh over a simulated minute of 20 Hz packets, before and after dirty tracking.
+
+    Tk variables live in a bare Tcl interpreter, so this runs without a display.
+    "per tick" is the old refresh of every tile on every ingest tick with data,
+    "per frame" refreshes changed tiles once every statRefreshDelay.
+    """
+    tcl = tk.Tcl()
+    seconds = 60
+    rate = 1000 // gendummy.delay
+    results = []
+    print(f"{'window':>9} {'fields sent':>11} {'refresh':>9} {'draws/s':>8} {'us/draw':>8} {'us/s':>8} {'var sets/s':>10}")
+    for window in ("Buffer", "This lap"):
+        for wide in (False, True):
+            schema = main.FieldSchema(main.expectedFields)
+            buffer = main.RollingBuffer(main.maxBufferLength, schema)
+            lap = laps.Lap(schema, 1, 0, 0, True)
+            fillBuffer(buffer, main.maxBufferLength // 10)
+            keys = main.expectedFields
+            start = time.time() * 1000
+            packets = []
+            for n in range(seconds * rate):
+                data = gendummy.getWideDummyData(len(keys)) if wide else gendummy.getDummyData()
+                if wide:
+                    # Every tile's field is in every packet
+                    data = dict(zip(keys, data.values()))
+                packets.append(schema.toRow(data))
+            for mode in ("per tick", "per frame"):
+                sets = [0]
+                class CountingVar(tk.StringVar):
+                    def set(self, value):
+                        sets[0] += 1
+                        super().set(value)
+                tiles = [[CountingVar(tcl) for _ in range(4)] for _ in keys]
+                renderers = [main.StatOverviewRenderer(buffer, key, *variables) for key, variables in zip(keys, tiles)]
+                stats = lap if window == "This lap" else None
+                elapsed = 0
+                draws = 0
+                frameEvery = max(main.statRefreshDelay // gendummy.delay, 1)
+                for n, row in enumerate(packets):
+                    t = start + n * gendummy.delay
+                    buffer.addRow(list(row), t)
+                    lap.add(row)
+                    if mode == "per frame" and (n + 1) % frameEvery:
+                        continue
+                    t0 = time.perf_counter()
+                    if mode == "per tick":
+                        for key, variables in zip(keys, tiles):
+                            legacyOverviewDraw(buffer, key, stats or buffer, variables)
+                    else:
+                        for renderer in renderers:
+                            renderer.draw(stats)
+                    elapsed += time.perf_counter() - t0
+                    draws += 1
+                result = {"window": window, "fieldsSent": len(keys) if wide else 4, "mode": mode,
+                          "drawsPerSecond": draws / seconds, "usPerDraw": elapsed / draws * 1e6,
+                          "usPerSecond": elapsed / seconds * 1e6, "varSetsPerSecond": sets[0] / seconds}
+                print(f"{window:>9} {result['fieldsSent']:>11} {mode:>9} {result['drawsPerSecond']:8.0f} "
+                      f"{result['usPerDraw']:8.1f} {result['usPerSecond']:8.0f} {result['varSetsPerSecond']:10.0f}")
+                results.append(result)
+    return results
+
+def benchDiagnostics(args):
+    """Cost of stage timing: main.ingestTick over queued packets with timings off and on, and Histogram.record alone
+    """
+    main.mainSchema = main.FieldSchema(main.expectedFields)
+    main.logConsole.rawEcho = "off"
+    lines = [gendummy.packLora(gendummy.getWideDummyData(args.fields)) for _ in range(10000)]
+    best = {False: math.inf, True: math.inf}
+    # Alternate and keep the best of each, the difference is well below run to run noise otherwise
+    for rep in range(8):
+        # Swap the order every pass, whichever runs second tends to be slower
+        for enabled in ((False, True) if rep % 2 else (True, False)):
+            # A fresh source every run, so buffer and laps state is the same for both
+            main.sources = {}
+            main.configureSources({"Car": {"port": None, "address": None}})
+            source = main.sources["Car"]
+            main.timings.enabled = enabled
+            now = time.time() * 1000
+            mono = time.monotonic()
+            for n, line in enumerate(lines):
+                source.queue.push((now - (len(lines) - n) * 0.01, line, main.parseLoraRow(line, main.mainSchema),
+                                   mono - (len(lines) - n) * 1e-5))
+            start = time.perf_counter()
+            main.ingestTick()
+            best[enabled] = min(best[enabled], (time.perf_counter() - start) / len(lines) * 1e6)
+    main.timings.enabled = False
+    results = {"disabledUs": best[False], "enabledUs": best[True]}
+    print(f"ingestTick per packet: timing off {best[False]:.2f} us, on {best[True]:.2f} us")
+    histogram = diagnostics.Histogram()
+    values = np.random.default_rng(1).lognormal(5, 1.5, 100000).tolist()
+    start = time.perf_counter()
+    for value in values:
+        histogram.record(value)
+    results["recordUs"] = (time.perf_counter() - start) / len(values) * 1e6
+    ordered = sorted(values)
+    for p in (50, 95, 99):
+        results[f"p{p}Error"] = histogram.percentile(p) / ordered[int(len(values) * p / 100)] - 1
+    print(f"Histogram.record {results['recordUs']:.3f} us, percentile error p50 {results['p50Error']:+.1%} "
+          f"p95 {results['p95Error']:+.1%} p99 {results['p99Error']:+.1%}")
+    return results
+
+def benchParse(args):
+    with open("dummy.txt", "rb") as f:
+        payloads = [line.strip() for line in f]
+    lines = [b"+RCV=%d,%d,%s,-40,12\r\n" % (main.carLoraAddress, len(p), p) for p in payloads]
+    schema = main.FieldSchema(main.expectedFields)
+    results = {}
+    parsers = {
+        "parseLoraPacket (str -> dict)": lambda line: main.parseLoraPacket(line.decode()),
+        "parseLoraRow (bytes -> row)": lambda line: main.parseLoraRow(line, schema),
+    }
+    for name, parser in parsers.items():
+        ms = timeIt(lambda: [parser(line) for line in lines], args.iterations)
+        results[name] = len(lines) / ms * 1000
+        print(f"{name:>32}: {results[name]:10.0f} packets/s")
+    # Parsing plus buffer insertion, where the row avoids the dict -> column mapping
+    buffer = main.RollingBuffer(main.maxBufferLength, schema)
+    ingest = {
+        "parseLoraPacket + add": lambda line: buffer.add(main.parseLoraPacket(line.decode()), 0),
+        "parseLoraRow + addRow": lambda line: buffer.addRow(main.parseLoraRow(line, schema), 0),
+    }
+    for name, step in ingest.items():
+        ms = timeIt(lambda: [step(line) for line in lines], args.iterations)
+        results[name] = len(lines) / ms * 1000
+        print(f"{name:>32}: {results[name]:10.0f} packets/s")
+    return results
+
+def benchFrame(args):
+    packets = [gendummy.getDummyData() for _ in range(1000)]
+    # Same packets with every field of the frame table filled in
+    full = [dict(p, FUEL=42.5, Slope=-3.2, OXY=0.87, INJ=2.1, LAT=3947.551, LON=8614.1234, ACCX=0.12, ACCY=-0.03, ACCZ=0.98)
+            for p in packets]
+    schema = main.FieldSchema(main.expectedFields)
+    results = {}
+    for name, data in (("4 fields", packets), ("13 fields", full)):
+        text = [gendummy.pack(p).encode() for p in data]
+        frames = [telemframe.encodeFrame(p, n) for n, p in enumerate(data)]
+        textSize = sum(len(t) for t in text) / len(text)
+        frameSize = sum(len(f) for f in frames) / len(frames)
+        print(f"{name}: TELEM text {textSize:.1f} B, binary frame {frameSize:.1f} B ({frameSize / textSize:.0%})")
+        lines = [b"+RCV=101,%d,%s,-40,12\r\n" % (len(f), f) for f in frames]
+        result = results[name] = {"textBytes": textSize, "frameBytes": frameSize}
+        steps = {
+            "encodeFrame": lambda: [telemframe.encodeFrame(p, n) for n, p in enumerate(data)],
+            "decodeFrame": lambda: [telemframe.decodeFrame(f) for f in frames],
+            "parseLoraRow": lambda: [main.parseLoraRow(line, schema) for line in lines],
+        }
+        for step, fn in steps.items():
+            result[step] = len(data) / timeIt(fn, args.iterations) * 1000
+            print(f"  {step + ':':<13} {result[step]:10.0f} frames/s")
+    return results
+
+def benchRecord(args):
+    lines = [b"+RCV=%d,%d,%s,-40,12\r\n" % (main.carLoraAddress, len(p), p)
+             for p in (gendummy.pack(gendummy.getDummyData()).strip().encode() for _ in range(1000))]
+    count = 200000
+    directory = tempfile.mkdtemp()
+    try:
+        recorder = session.SessionRecorder(directory, name="bench")
+        recorder.start()
+        # Cost seen by the reader thread, per recorded line
+        start = time.perf_counter()
+        for n in range(count):
+            recorder.record(n * 0.5, lines[n % len(lines)])
+        callUs = (time.perf_counter() - start) / count * 1e6
+        recorder.close()
+        elapsed = time.perf_counter() - start
+        size = sum(os.path.getsize(p) for p in session.sessionParts(os.path.join(directory, "bench-0001.rec")))
+        print(f"record(): {callUs:.2f} us/line, written {recorder.recorded} dropped {recorder.dropped}")
+        print(f"writer: {recorder.recorded / elapsed:.0f} lines/s, {size / elapsed / 1e6:.1f} MB/s")
+        reader = session.SessionReader(os.path.join(directory, "bench-0001.rec"))
+        seekUs = timeIt(lambda: reader.seek(count * 0.25), args.iterations) * 1000
+        print(f"seek to the middle: {seekUs:.1f} us over {len(reader.times)} index blocks")
+        reader.close()
+    finally:
+        shutil.rmtree(directory)
+    return {"recordUs": callUs, "recorded": recorder.recorded, "dropped": recorder.dropped,
+            "linesPerSecond": recorder.recorded / elapsed, "mbPerSecond": size / elapsed / 1e6, "seekUs": seekUs}
+
+class TileHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in tile server, answers /z/x/y.png with the same PNG after `delay` seconds
+    """
+    delay = 0
+    tile = None
+    requests = 0
+
+    def do_GET(self):
+        TileHandler.requests += 1
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.tile)))
+        self.end_headers()
+        self.wfile.write(self.tile)
+
+    def log_message(self, *args):
+        pass
+
+def benchTiles(args):
+    png = io.BytesIO()
+    Image.new("RGB", (256, 256), (200, 220, 200)).save(png, "PNG")
+    TileHandler.tile = png.getvalue()
+    # Round trip of a tile request over a poor connection
+    TileHandler.delay = 0.05
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        cache = tilecache.TileCache(os.path.join(directory, "tiles.db"), url, main.mapMaxZoom)
+        print(f"{'region':>22} {'tiles':>6} {'stored':>6} {'fetched':>7} {'failed':>6} {'p50 ms':>7} {'p99 ms':>7} {'s':>6}")
+        for name, corners in main.mapRegions.items():
+            for run in ("cold", "warm"):
+                start = time.perf_counter()
+                result = cache.prefetch(corners, margin=main.mapTileMargin)
+                elapsed = time.perf_counter() - start
+                fetchMs = result.pop("fetchMs")
+                result.update(seconds=elapsed, fetchP50Ms=percentile(fetchMs, 50), fetchP99Ms=percentile(fetchMs, 99))
+                results[f"{name} {run}"] = result
+                print(f"{name + ' ' + run:>22} {result['tiles']:>6} {result['stored']:>6} {result['fetched']:>7} {result['failed']:>6} "
+                      f"{result['fetchP50Ms']:7.1f} {result['fetchP99Ms']:7.1f} {elapsed:6.2f}")
+        # What the map widget does per tile while drawing: database lookup then PNG decode, for the
+        # view around each region at every zoom level, including tiles outside the prefetched margin
+        requestsBefore = TileHandler.requests
+        loadMs = []
+        for corners in main.mapRegions.values():
+            for zoom in range(main.mapMaxZoom + 1):
+                for x, y in tilecache.regionTiles(corners, zoom, main.mapTileMargin + 1):
+                    start = time.perf_counter()
+                    data = cache.get(zoom, x, y)
+                    if data is not None:
+                        Image.open(io.BytesIO(data)).load()
+                    loadMs.append((time.perf_counter() - start) * 1000)
+        results["render"] = {"lookups": len(loadMs), "hitRate": cache.hitRate(), "loadP50Ms": percentile(loadMs, 50),
+                             "loadP99Ms": percentile(loadMs, 99), "networkRequests": TileHandler.requests - requestsBefore}
+        print(f"render: {len(loadMs)} lookups, hit rate {cache.hitRate():.1%}, load p50 {percentile(loadMs, 50):.2f} ms "
+              f"p99 {percentile(loadMs, 99):.2f} ms, {results['render']['networkRequests']} network requests")
+        cache.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(directory)
+    return results
+
+class RecordingPath():
+    """Stands in for a CanvasPath: projects every point to tile coordinates on each
+    draw, which is what dominates CanvasPath.draw, and keeps count of them
+    """
+    def __init__(self, widget, positions):
+        self.widget = widget
+        self.set_position_list(positions)
+        widget.paths.append(self)
+
+    def set_position_list(self, positions):
+        self.positions = positions
+        self.draw()
+
+    def draw(self):
+        for lat, lon in self.positions:
+            decimal_to_osm(lat, lon, 17)
+        self.widget.projected += len(self.positions)
+
+    def delete(self):
+        self.widget.paths.remove(self)
+
+class RecordingMap():
+    def __init__(self):
+        self.paths = []
+        self.projected = 0
+
+    def set_path(self, positions, **kwargs):
+        return RecordingPath(self, positions)
+
+    def redraw(self):
+        """What the widget does to every path on a pan or zoom
+        """
+        for path in self.paths:
+            path.draw()
+
+def ovalTrack(count, rate=20, lapMetres=4000, speed=40):
+    """`count` noisy GPS fixes going round an oval at `speed` m/s
+    """
+    rng = np.random.default_rng(1)
+    corners = main.mapRegions["Indianapolis Speedway"]
+    lat0 = (corners[0][0] + corners[1][0]) / 2
+    lon0 = (corners[0][1] + corners[1][1]) / 2
+    radius = lapMetres / (2 * np.pi)
+    angle = np.arange(count) * speed / rate / radius
+    north = radius * 0.5 * np.sin(angle) + rng.normal(0, 0.5, count)
+    east = radius * np.cos(angle) + rng.normal(0, 0.5, count)
+    lat = lat0 + north / track.metresPerDegree
+    lon = lon0 + east / (track.metresPerDegree * np.cos(np.radians(lat0)))
+    return lat, lon
+
+def benchTrack(args):
+    rate = 20
+    perFrame = max(main.displayRefreshDelay * rate // 1000, 1)
+    count = int(args.hours * 3600 * rate)
+    lat, lon = ovalTrack(count, rate)
+    log = track.TrackLog()
+    widget = RecordingMap()
+    layer = track.TrackLayer(widget, log, main.trackChunkSize, main.trackTolerance, main.trackMaxPoints)
+    results = []
+    frameMs = []
+    checkpoint = 0.25
+    print(f"{'hours':>5} {'fixes':>8} {'canvas pts':>10} {'tol m':>6} {'frame p50':>9} {'frame p99':>9} {'frame max':>9} {'redraw ms':>9}")
+    for n in range(count):
+        log.append(lat[n], lon[n], n * 1000 / rate)
+        if (n + 1) % perFrame == 0:
+            start = time.perf_counter()
+            layer.draw()
+            frameMs.append((time.perf_counter() - start) * 1000)
+        if n + 1 >= checkpoint * 3600 * rate:
+            redrawMs = timeIt(widget.redraw, 3)
+            result = {"hours": checkpoint, "fixes": n + 1, "canvasPoints": layer.pointCount(), "tolerance": layer.tolerance,
+                      "frameP50Ms": percentile(frameMs, 50), "frameP99Ms": percentile(frameMs, 99),
+                      "frameMaxMs": max(frameMs), "redrawMs": redrawMs}
+            results.append(result)
+            print(f"{checkpoint:5.2f} {n + 1:>8} {result['canvasPoints']:>10} {layer.tolerance:6.1f} {result['frameP50Ms']:9.3f} "
+                  f"{result['frameP99Ms']:9.3f} {result['frameMaxMs']:9.3f} {redrawMs:9.2f}")
+            frameMs = []
+            checkpoint *= 2
+    return results
+
+def benchLaps(args):
+    """Lap index upkeep per sample, and per-lap statistics from the index against rescanning the buffer
+    """
+    rate = 20
+    count = int(args.hours * 3600 * rate)
+    corners = main.lapGates["Indianapolis Speedway"]
+    lat, lon = ovalTrack(count, rate)
+    # Move the oval so its western straight runs through the middle of the gate
+    lon = lon - lon.min() + corners[0][1] + (corners[1][1] - corners[0][1]) / 2 - 0.0001
+    lat = lat - (lat.max() + lat.min()) / 2 + corners[0][0]
+    schema = main.FieldSchema(main.expectedFields)
+    buffer = main.RollingBuffer(main.maxBufferLength, schema)
+    index = laps.LapIndex(schema, corners, main.minLapMs)
+    rows = [schema.toRow(gendummy.getDummyData()) for _ in range(1000)]
+    start = time.time() * 1000 - count * 1000 / rate
+    addNs = 0
+    for n in range(count):
+        row = rows[n % len(rows)]
+        t = start + n * 1000 / rate
+        seq = buffer.head
+        buffer.addRow(row, t)
+        t0 = time.perf_counter_ns()
+        index.add(seq, t, row, (lat[n], lon[n]))
+        addNs += time.perf_counter_ns() - t0
+    best = index.best()
+    last = index.last()
+    fields = main.expectedFields
+    def fromIndex():
+        for lap in (last, best):
+            for field in fields:
+                lap.getMin(field), lap.getAvg(field), lap.getMax(field)
+    def rescan():
+        for lap in (last, best):
+            for field in fields:
+                _, values = buffer.getRange(field, lap.startSeq, lap.endSeq)
+                if len(values) and not np.isnan(values).all():
+                    np.nanmin(values), np.nanmean(values), np.nanmax(values)
+    results = {"samples": count, "laps": len(index.laps), "bestLapMs": best.lapTime() if best else None,
+               "addUs": addNs / count / 1000, "indexQueryUs": timeIt(fromIndex, args.iterations) * 1000,
+               "rescanQueryUs": timeIt(rescan, args.iterations) * 1000}
+    print(f"{count} samples, {results['laps']} laps, best {main.formatLapTime(results['bestLapMs'])}")
+    print(f"LapIndex.add: {results['addUs']:.2f} us/sample")
+    print(f"last vs best lap MIN/AVG/MAX of {len(fields)} fields: index {results['indexQueryUs']:.1f} us, "
+          f"buffer rescan {results['rescanQueryUs']:.1f} us")
+    return results
+
+def benchDerived(args):
+    """Cost per packet of the derived channels, against the hand written Slope it replaced
+    """
+    channels = {
+        "Slope": "-degrees(atan2(ACCZ, -ACCX))",
+        "Power": "RPM * Throttle / 100",
+        "BVSmooth": "ema(BV, 0.1)",
+        "FuelFlow": "deriv(INJ)",
+        "SpeedAvg": "mean(Speed, 20)",
+    }
+    schema = main.FieldSchema(main.expectedFields)
+    packets = [dict(gendummy.getDummyData(), INJ=2.1 + n * 0.01, ACCX=-0.1, ACCZ=0.98) for n in range(1000)]
+    rows = [schema.toRow(p) for p in packets]
+    results = {}
+    slope = schema.indexOf("Slope")
+    def handWritten():
+        for row in rows:
+            z = schema.get(row, "ACCZ")
+            x = schema.get(row, "ACCX")
+            if z and x:
+                row[slope] = -math.degrees(math.atan2(z, -x))
+    results["hand written Slope"] = timeIt(handWritten, args.iterations) / len(rows) * 1000
+    for count in (1, len(channels)):
+        engine = derived.DerivedChannels(schema, dict(list(channels.items())[:count]))
+        def apply():
+            for n, row in enumerate(rows):
+                engine.apply(row, n * 50.0)
+        results[f"{count} derived"] = timeIt(apply, args.iterations) / len(rows) * 1000
+    for name, us in results.items():
+        print(f"{name:>20}: {us:6.2f} us/packet")
+    return results
+
+def writeLargeRecording(path, gigabytes, rate=20):
+    """Write a recording of about `gigabytes` with its index, straight from numpy rather than through SessionRecorder
+    """
+    # Every line the same length, so the records can be laid out as one structured array
+    lines = []
+    while len(lines) < 1000:
+        line = gendummy.packLora(gendummy.getDummyData())
+        if len(line) == 76:
+            lines.append(line)
+    recordType = np.dtype([("time", "<f8"), ("length", "<u4"), ("line", f"S{len(lines[0])}")])
+    count = int(gigabytes * 1e9 / recordType.itemsize)
+    perBlock = -(-64 * 1024 // recordType.itemsize)
+    start = time.time() * 1000 - count * 1000 / rate
+    chunk = np.empty(1000000, dtype=recordType)
+    chunk["length"] = len(lines[0])
+    chunk["line"] = np.resize(np.array(lines), len(chunk))
+    with open(path + ".rec", "wb") as data, open(path + ".idx", "wb") as index:
+        data.write(session.MAGIC)
+        for first in range(0, count, len(chunk)):
+            n = min(len(chunk), count - first)
+            chunk["time"][:n] = start + (first + np.arange(n)) * 1000 / rate
+            data.write(chunk[:n].tobytes())
+        blocks = np.arange(0, count, perBlock)
+        entries = np.empty(len(blocks), dtype=[("time", "<f8"), ("offset", "<u8")])
+        entries["time"] = start + blocks * 1000 / rate
+        entries["offset"] = len(session.MAGIC) + blocks * recordType.itemsize
+        index.write(entries.tobytes())
+    return count
+
+def benchAnalysis(args):
+    """Open a multi-GB recording and plot it, the way File > Analyze Session does
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench-0001")
+    results = {}
+    try:
+        start = time.perf_counter()
+        count = writeLargeRecording(path, args.gb)
+        print(f"wrote {count} records, {os.path.getsize(path + '.rec') / 1e9:.2f} GB in {time.perf_counter() - start:.1f} s")
+        main.mainSchema = main.FieldSchema(main.expectedFields)
+        fields = ["RPM", "Throttle", "Speed", "BV"]
+        figure = Figure(figsize=(6.4, 4.8), dpi=100, layout="tight")
+        renderer = main.GraphRenderer(figure, FigureCanvasAgg(figure), None)
+        renderer.fields = fields
+        # Open to first plot, with the overview thread already competing for the interpreter
+        start = time.perf_counter()
+        source = analysis.AnalysisSource(path + ".rec", main.mainSchema, main.analysisParser)
+        results["openMs"] = (time.perf_counter() - start) * 1000
+        renderer.source = source
+        renderer.draw()
+        results["firstPlotMs"] = (time.perf_counter() - start) * 1000
+        results["fullViewMs"] = timeIt(renderer.draw, args.iterations)
+        # Zoom into a few minutes somewhere in the middle, first from disk and then from the decoded block cache
+        middle = (source.startTime + source.endTime) / 2
+        for span in (60000 * 5, 60000):
+            source.setView(middle, span)
+            start = time.perf_counter()
+            renderer.draw()
+            results[f"zoom{span // 60000}mColdMs"] = (time.perf_counter() - start) * 1000
+            results[f"zoom{span // 60000}mWarmMs"] = timeIt(renderer.draw, args.iterations)
+        # How far the overview gets in a few seconds of otherwise idle time
+        before = source.built.sum()
+        time.sleep(3)
+        blocksPerSecond = (source.built.sum() - before) / 3
+        results["overviewBlocksPerSecond"] = blocksPerSecond
+        results["overviewEstimateS"] = len(source.blockTimes) / blocksPerSecond if blocksPerSecond else None
+        source.close()
+        print(f"{len(source.blockTimes)} blocks: open {results['openMs']:.0f} ms, open to first plot {results['firstPlotMs']:.0f} ms, "
+              f"full view redraw {results['fullViewMs']:.1f} ms")
+        for span in (5, 1):
+            print(f"zoom to {span} min: {results[f'zoom{span}mColdMs']:.1f} ms cold, {results[f'zoom{span}mWarmMs']:.1f} ms warm")
+        print(f"overview builds at {blocksPerSecond:.0f} blocks/s, about {results['overviewEstimateS'] or 0:.0f} s for the whole recording")
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+def benchExport(args):
+    """Export a recording of --hours and a full buffer to every format, and the cost live CSV export adds to ingest
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench-0001")
+    results = {}
+    try:
+        # writeLargeRecording lays out 88 byte records, 20 per second
+        count = writeLargeRecording(path, args.hours * 3600 * 20 * 88 / 1e9)
+        main.mainSchema = main.FieldSchema(main.expectedFields)
+        main.setDerivedChannels(main.derivedChannels)
+        fields = list(main.mainSchema.names)
+        print(f"{count} records, {args.hours:g} h at 20 Hz, {len(fields)} columns")
+        for name in export.formats():
+            out = os.path.join(directory, "session." + name)
+            chunks = export.sessionChunks(path + ".rec", main.mainSchema, fields, main.analysisParser(), address=main.rcvAddress)
+            result = export.exportChunks(out, fields + ["address"], chunks)
+            # Again under tracemalloc for the peak, which slows it down too much to time
+            tracemalloc.start()
+            chunks = export.sessionChunks(path + ".rec", main.mainSchema, fields, main.analysisParser(), address=main.rcvAddress)
+            export.exportChunks(out, fields + ["address"], chunks)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[f"session {name}"] = {"rows": result["rows"], "rowsPerSecond": result["rows"] / result["seconds"],
+                                          "MBPerSecond": result["bytes"] / 1e6 / result["seconds"],
+                                          "fileMB": result["bytes"] / 1e6, "peakMB": peak / 1e6}
+        buffer = main.RollingBuffer(main.maxBufferLength, main.FieldSchema(main.expectedFields))
+        now = time.time() * 1000
+        rows = [gendummy.getWideDummyData(args.fields) for _ in range(1000)]
+        for n in range(main.maxBufferLength):
+            buffer.add(rows[n % len(rows)], now - (main.maxBufferLength - n) * 50)
+        bufferFields = list(buffer.schema.names)
+        for name in export.formats():
+            result = export.exportChunks(os.path.join(directory, "buffer." + name), bufferFields,
+                                         export.bufferChunks(buffer, bufferFields))
+            results[f"buffer {name}"] = {"rows": result["rows"], "rowsPerSecond": result["rows"] / result["seconds"],
+                                         "MBPerSecond": result["bytes"] / 1e6 / result["seconds"],
+                                         "fileMB": result["bytes"] / 1e6, "peakMB": None}
+        print(f"{'export':>16} {'rows':>9} {'rows/s':>9} {'MB/s':>7} {'file MB':>8} {'peak MB':>8}")
+        for name, r in results.items():
+            peak = f"{r['peakMB']:8.1f}" if r["peakMB"] is not None else f"{'':>8}"
+            print(f"{name:>16} {r['rows']:>9} {r['rowsPerSecond']:9.0f} {r['MBPerSecond']:7.1f} {r['fileMB']:8.1f} {peak}")
+        # One hour of ingest ticks of a single row each. add() is all live export puts on the UI thread, the
+        # queue holds the whole burst so the writer's sustained rate shows instead of drops
+        ticks = [([now + n * 50], [buffer.schema.toRow(rows[n % len(rows)])]) for n in range(72000)]
+        exporter = export.LiveExport(os.path.join(directory, "live.csv"), bufferFields, queueSize=len(ticks))
+        exporter.start()
+        start = time.perf_counter()
+        for times, tickRows in ticks:
+            exporter.add(times, tickRows)
+        addUs = (time.perf_counter() - start) / len(ticks) * 1e6
+        exporter.close()
+        rowsPerSecond = exporter.rows / (time.perf_counter() - start)
+        results["live csv"] = {"addUs": addUs, "rowsPerSecond": rowsPerSecond, "rows": exporter.rows,
+                               "dropped": exporter.dropped}
+        print(f"live csv: add {addUs:.2f} us per tick, writer {rowsPerSecond:.0f} rows/s, "
+              f"{exporter.rows} written, {exporter.dropped} dropped")
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+def stageSummary(samples):
+    """Percentiles in microseconds for a list of perf_counter_ns durations
+    """
+    us = [n / 1000 for n in samples]
+    return {"count": len(us), "meanUs": sum(us) / len(us) if us else float("nan"),
+            "p50Us": percentile(us, 50), "p95Us": percentile(us, 95), "p99Us": percentile(us, 99)}
+
+def benchPipeline(args):
+    """parse -> buffer insert -> stat refresh -> graph draw, with packets stamped 50 ms apart ending now
+    """
+    schema = main.FieldSchema(main.expectedFields)
+    buffer = main.RollingBuffer(main.maxBufferLength, schema)
+    figure = Figure(figsize=(6.4, 4.8), dpi=100, layout="tight")
+    renderer = main.GraphRenderer(figure, FigureCanvasAgg(figure), buffer)
+    renderer.fields = ["RPM", "Throttle", "Speed", "BV"]
+    renderer.limit = "30m"
+    statFields = list(main.expectedFields)
+    stages = {"parse": [], "insert": [], "stats": [], "draw": []}
+    clock = time.perf_counter_ns
+    packetsPerFrame = max(main.displayRefreshDelay // gendummy.delay, 1)
+    start = time.time() * 1000 - args.packets * gendummy.delay
+    gendummy.i = 0
+    done = 0
+    while done < args.packets:
+        # Generate in chunks so packet construction stays out of the timings and memory stays flat
+        chunk = [gendummy.packLora(gendummy.getWideDummyData(args.fields)) for _ in range(min(10000, args.packets - done))]
+        for line in chunk:
+            t0 = clock()
+            row = main.parseLoraRow(line, schema)
+            t1 = clock()
+            buffer.addRow(row, start + done * gendummy.delay)
+            t2 = clock()
+            for field in statFields:
+                buffer.getLast(field)
+                buffer.getMin(field)
+                buffer.getAvg(field)
+                buffer.getMax(field)
+            t3 = clock()
+            stages["parse"].append(t1 - t0)
+            stages["insert"].append(t2 - t1)
+            stages["stats"].append(t3 - t2)
+            done += 1
+            if done % packetsPerFrame == 0 and done > args.packets - args.frames * packetsPerFrame:
+                # Only draw the last frames, a full run of frames would be dominated by Agg
+                t0 = clock()
+                renderer.draw()
+                stages["draw"].append(clock() - t0)
+    ingestNs = sum(stages["parse"]) + sum(stages["insert"]) + sum(stages["stats"])
+    results = {
+        "packets": args.packets,
+        "fields": len(schema),
+        "ingestPacketsPerSecond": args.packets / ingestNs * 1e9,
+        "stages": {name: stageSummary(samples) for name, samples in stages.items()},
+        "bufferMB": (buffer.times.nbytes + sum(c.nbytes for c in buffer.columns)
+                     + sum(sum(a.nbytes for a in col) + tier.times.nbytes for tier in buffer.tiers for col in tier.columns)) / 1e6,
+        # ru_maxrss is in KiB on Linux
+        "peakRssMB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(f"{args.packets} packets x {len(schema)} fields, {results['ingestPacketsPerSecond']:.0f} packets/s ingest")
+    print(f"{'stage':>7} {'mean us':>9} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9}")
+    for name, summary in results["stages"].items():
+        print(f"{name:>7} {summary['meanUs']:9.1f} {summary['p50Us']:9.1f} {summary['p95Us']:9.1f} {summary['p99Us']:9.1f}")
+    print(f"buffer {results['bufferMB']:.1f} MB, peak RSS {results['peakRssMB']:.1f} MB")
+    return results
+
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+benchmarks = {
+    "pipeline": benchPipeline,
+    "draw": benchDraw,
+    "serial": benchSerial,
+    "parse": benchParse,
+    "frame": benchFrame,
+    "record": benchRecord,
+    "tiles": benchTiles,
+    "track": benchTrack,
+    "laps": benchLaps,
+    "derived": benchDerived,
+    "analysis": benchAnalysis,
+    "sources": benchSources,
+    "fanout": benchFanout,
+    "overview": benchOverview,
+    "diagnostics": benchDiagnostics,
+    "export": benchExport,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Field-side benchmarks")
+    parser.add_argument("benchmark", choices=list(benchmarks.keys()) + ["all"])
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("-d", "--duration", type=float, default=5, help="seconds per serial run")
+    parser.add_argument("-p", "--packets", type=int, default=main.maxBufferLength,
+                        help="packets through the pipeline, the default fills one hour of buffer")
+    parser.add_argument("-f", "--fields", type=int, default=20, help="fields per pipeline packet")
+    parser.add_argument("--hours", type=float, default=4, help="session length for the track, laps and export benchmarks")
+    parser.add_argument("--gb", type=float, default=2, help="recording size for the analysis benchmark")
+    parser.add_argument("--frames", type=int, default=50, help="graph frames drawn at the end of the pipeline run")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+    names = list(benchmarks.keys()) if args.benchmark == "all" else [args.benchmark]
+    results = {}
+    for name in names:
+        print(f"== {name}")
+        results[name] = benchmarks[name](args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"commit": gitCommit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
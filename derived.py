@@ -0,0 +1,220 @@
+"""Derived channels, computed from other fields as each packet is ingested.
+
+A channel is a name and a Python expression over field names, for example
+
+    "Power":     "RPM * Throttle / 100"
+    "BVSmooth":  "ema(BV, 0.1)"
+    "FuelFlow":  "deriv(INJ)"
+
+Expressions may use numbers, arithmetic, comparisons, `a if cond else b`, the
+functions in `functions` and the windowed functions in `windowFunctions`,
+whose parameters after the first must be constants. They are checked against
+that whitelist, then all channels are compiled together into one function
+that fills the derived columns of a row in place. A channel can use channels
+defined before it.
+
+A missing input makes the result NaN, like a missing sample. A NaN result
+leaves the column alone, so a channel never hides a value the car sent for a
+field of the same name.
+"""
+import ast
+import math
+
+def nmea(value):
+    """NMEA ddmm.mmmm to decimal degrees
+    """
+    sign = -1 if value < 0 else 1
+    value = abs(value)
+    degrees = value // 100
+    return sign * (degrees + (value - degrees * 100) / 60)
+
+functions = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "exp": math.exp,
+    "log": math.log,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "atan2": math.atan2,
+    "hypot": math.hypot,
+    "degrees": math.degrees,
+    "radians": math.radians,
+    "nmea": nmea,
+}
+constants = {"pi": math.pi, "nan": math.nan}
+
+class Ema():
+    """ema(x, alpha): exponential moving average, alpha is the weight of the newest sample
+    """
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = math.nan
+
+    def __call__(self, value, t):
+        if value != value:
+            return math.nan
+        if self.value != self.value:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+class Deriv():
+    """deriv(x): rate of change of x per second since its previous sample
+    """
+    def __init__(self):
+        self.value = math.nan
+        self.time = None
+
+    def __call__(self, value, t):
+        if value != value:
+            return math.nan
+        result = math.nan
+        if self.time is not None and t > self.time:
+            result = (value - self.value) * 1000 / (t - self.time)
+        self.value = value
+        self.time = t
+        return result
+
+class Mean():
+    """mean(x, n): mean of the last n samples of x
+    """
+    def __init__(self, n):
+        self.values = [0.0] * int(n)
+        self.pos = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def __call__(self, value, t):
+        if value != value:
+            return math.nan
+        size = len(self.values)
+        if self.count == size:
+            self.sum -= self.values[self.pos]
+        else:
+            self.count += 1
+        self.values[self.pos] = value
+        self.sum += value
+        self.pos = (self.pos + 1) % size
+        return self.sum / self.count
+
+# name: (state class, number of constant parameters after the input)
+windowFunctions = {
+    "ema": (Ema, 1),
+    "deriv": (Deriv, 0),
+    "mean": (Mean, 1),
+}
+
+allowedNodes = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name,
+    ast.Constant, ast.Load, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+class _Compiler(ast.NodeTransformer):
+    """Checks one expression and rewrites field names to row subscripts and window calls to their state objects
+    """
+    def __init__(self, channel, schema, later, states):
+        self.channel = channel
+        self.schema = schema
+        self.later = later
+        self.states = states
+
+    def fail(self, message):
+        raise ValueError(f"Derived channel {self.channel}: {message}")
+
+    def generic_visit(self, node):
+        if not isinstance(node, allowedNodes):
+            self.fail(f"{type(node).__name__} is not allowed")
+        return super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            self.fail(f"{node.value!r} is not a number")
+        return node
+
+    def visit_Name(self, node):
+        if node.id in constants:
+            return node
+        if node.id in functions or node.id in windowFunctions:
+            self.fail(f"{node.id} is a function")
+        if node.id in self.later:
+            self.fail(f"{node.id} is defined after this channel")
+        # Fields the car has not sent yet get their column now, like in FieldSchema.toRow
+        idx = self.schema.indexOf(node.id)
+        return ast.copy_location(ast.Subscript(ast.Name("row", ast.Load()), ast.Constant(idx), ast.Load()), node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            self.fail("only plain calls of the listed functions are allowed")
+        name = node.func.id
+        if name in functions:
+            node.args = [self.visit(arg) for arg in node.args]
+            return node
+        if name not in windowFunctions:
+            self.fail(f"unknown function {name}")
+        cls, params = windowFunctions[name]
+        if len(node.args) != params + 1:
+            self.fail(f"{name} takes {params + 1} argument(s)")
+        values = []
+        for arg in node.args[1:]:
+            if not isinstance(arg, ast.Constant) or type(arg.value) not in (int, float):
+                self.fail(f"parameters of {name} must be numbers")
+            values.append(arg.value)
+        state = f"_state{len(self.states)}"
+        self.states[state] = cls(*values)
+        call = ast.Call(ast.Name(state, ast.Load()), [self.visit(node.args[0]), ast.Name("t", ast.Load())], [])
+        return ast.copy_location(call, node)
+
+class DerivedChannels():
+    """A compiled set of derived channels for one schema.
+
+    Every channel gets a schema column when compiled, so the buffer stores,
+    graphs and summarizes it like a raw field. apply() is called once per
+    packet, before the row goes into the buffer.
+    """
+    def __init__(self, schema, channels):
+        self.schema = schema
+        self.channels = dict(channels)
+        states = {}
+        lines = ["def derive(row, t):"]
+        names = list(self.channels)
+        for i, (name, expression) in enumerate(self.channels.items()):
+            try:
+                tree = ast.parse(expression, mode="eval")
+            except SyntaxError as e:
+                raise ValueError(f"Derived channel {name}: {e.msg}") from None
+            compiler = _Compiler(name, schema, set(names[i + 1:]), states)
+            tree = ast.fix_missing_locations(compiler.visit(tree))
+            idx = schema.indexOf(name)
+            lines += [
+                "    try:",
+                f"        v = {ast.unparse(tree.body)}",
+                "    except (ArithmeticError, ValueError, TypeError):",
+                "        v = nan",
+                "    if v == v:",
+                f"        row[{idx}] = float(v)",
+            ]
+        lines.append("    return row")
+        self.source = "\n".join(lines)
+        builtins = {"float": float, "ArithmeticError": ArithmeticError, "ValueError": ValueError, "TypeError": TypeError}
+        namespace = {"__builtins__": builtins, **functions, **constants, **states}
+        exec(compile(self.source, "<derived channels>", "exec"), namespace)
+        self.derive = namespace["derive"]
+        self.width = len(schema)
+
+    def names(self):
+        return list(self.channels)
+
+    def apply(self, row, t):
+        """Fill the derived columns of a schema row received at `t` ms, in place
+        """
+        if len(row) < self.width:
+            row.extend([math.nan] * (self.width - len(row)))
+        return self.derive(row, t)
@@ -0,0 +1,111 @@
+"""Latency histograms for the stages between the radio and the screen.
+
+Each stage gets a Histogram of durations in microseconds, counted in log
+spaced buckets, eight per doubling, so recording is a log2 and an increment
+and percentiles are accurate to within about 9%. Nothing is kept per sample,
+so memory stays fixed however long a session runs.
+
+Callers check `enabled` before taking any timestamps, so instrumentation
+costs one attribute lookup per packet while it is switched off. Reader
+threads record without a lock. A rare lost increment only makes a count off
+by one, which a diagnostic can live with.
+"""
+import json
+import math
+import time
+
+class Histogram():
+    """Counts of durations in µs, bucket n holding values up to 2 ** (n / bucketsPerOctave)
+    """
+    bucketsPerOctave = 8
+    # Up to 2 ** 32 µs, a bit over an hour
+    buckets = 32 * bucketsPerOctave + 1
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, us):
+        if us <= 1:
+            idx = 0
+        else:
+            idx = min(math.ceil(math.log2(us) * self.bucketsPerOctave), self.buckets - 1)
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, NaN when empty
+        """
+        if not self.count:
+            return math.nan
+        target = self.count * p / 100
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(2 ** (idx / self.bucketsPerOctave), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "meanUs": self.total / self.count if self.count else math.nan,
+            "p50Us": self.percentile(50),
+            "p95Us": self.percentile(95),
+            "p99Us": self.percentile(99),
+            "maxUs": self.max if self.count else math.nan,
+        }
+
+class StageTimings():
+    """A Histogram per stage plus a late packet count per source.
+
+    Per packet stages check `enabled` inline and call record(). Once per
+    frame stages can use start() and stop(), which do nothing when disabled.
+    """
+    def __init__(self, stages, enabled=False):
+        self.stages = {stage: Histogram() for stage in stages}
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        for histogram in self.stages.values():
+            histogram.reset()
+        self.late = {}
+        # Wall time only for showing when counting started, the duration comes from the monotonic clock
+        self.since = time.time()
+        self.started = time.monotonic()
+
+    def record(self, stage, us):
+        self.stages[stage].record(us)
+
+    def countLate(self, source):
+        self.late[source] = self.late.get(source, 0) + 1
+
+    def start(self):
+        return time.perf_counter_ns() if self.enabled else None
+
+    def stop(self, stage, started):
+        if started is not None:
+            self.stages[stage].record((time.perf_counter_ns() - started) / 1000)
+
+    def snapshot(self):
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.since)),
+            "seconds": time.monotonic() - self.started,
+            "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+            "late": dict(self.late),
+        }
+
+    def export(self, path, extra=None):
+        """Write snapshot(), plus anything in `extra`, to a JSON file
+        """
+        with open(path, "w") as f:
+            json.dump({**self.snapshot(), **(extra or {})}, f, indent=2)
@@ -0,0 +1,291 @@
+"""Streaming export of telemetry to CSV, chunked .npz and, with pyarrow installed, Parquet.
+
+Samples go through in chunks of at most `chunkRows`, and a writer only ever
+holds one chunk, so memory stays bounded however long the session is. Every
+format has a `time` column (receive time, ms since the epoch) and one float
+column per field:
+
+- CSV: a header line, then one line per sample, missing samples are empty.
+- .npz: a single zip written member by member. Chunk n of a column is stored
+  as `<column>_<n>`, readNpz() joins the chunks back into one array each.
+  Missing samples are NaN.
+- Parquet: one row group per chunk, missing samples are null.
+
+Chunks come from a live RollingBuffer (bufferChunks), a recorded session
+(sessionChunks), or from ingest itself through LiveExport, which writes
+from a thread of its own while a run is in progress. .npz and Parquet files
+are only readable once closed, so live export writes CSV, which is complete
+up to its last flushed line at any time.
+"""
+import os
+import queue
+import time
+import zipfile
+from threading import Thread
+
+import numpy as np
+
+import session
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+class CsvWriter():
+    def __init__(self, path, fields):
+        self.file = open(path, "w", newline="", buffering=1024 * 1024)
+        self.file.write(",".join(["time"] + fields) + "\n")
+
+    def write(self, times, values):
+        lines = []
+        for t, row in zip(times.tolist(), values.tolist()):
+            # repr round-trips every float, NaN becomes an empty cell
+            lines.append(f"{t:.3f}," + ",".join(["" if v != v else repr(v) for v in row]))
+        self.file.write("\n".join(lines) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class NpzWriter():
+    def __init__(self, path, fields):
+        self.fields = fields
+        self.chunk = 0
+        # Stored rather than deflated, float telemetry barely compresses and deflate would dominate the cost
+        self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+
+    def _array(self, name, array):
+        with self.zip.open(f"{name}_{self.chunk:06d}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+    def write(self, times, values):
+        self._array("time", times)
+        for i, field in enumerate(self.fields):
+            self._array(field, values[:, i])
+        self.chunk += 1
+
+    def flush(self):
+        # Members are complete once written, the central directory only gets written on close
+        pass
+
+    def close(self):
+        self.zip.close()
+
+class ParquetWriter():
+    def __init__(self, path, fields):
+        if pyarrow is None:
+            raise ValueError("Parquet export needs pyarrow, install it with pip install pyarrow")
+        self.fields = fields
+        self.schema = pyarrow.schema([("time", pyarrow.float64())] + [(field, pyarrow.float64()) for field in fields])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, times, values):
+        # from_pandas turns NaN into null
+        arrays = [pyarrow.array(times)] + [pyarrow.array(values[:, i], from_pandas=True) for i in range(len(self.fields))]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.writer.close()
+
+writers = {"csv": CsvWriter, "npz": NpzWriter, "parquet": ParquetWriter}
+
+def formats():
+    """Formats this installation can write
+    """
+    return [name for name in writers if name != "parquet" or pyarrow is not None]
+
+def openWriter(path, fields):
+    """A writer for `path`, picked by its extension
+    """
+    name = os.path.splitext(path)[1].lstrip(".").lower()
+    if name not in writers:
+        raise ValueError(f"Cannot export to .{name} files, use one of {', '.join(formats())}")
+    return writers[name](path, list(fields))
+
+def readNpz(path):
+    """{column: array} of an .npz export, chunks joined in order
+    """
+    parts = {}
+    with np.load(path) as data:
+        # Chunk numbers are zero padded, so sorting keeps them in order
+        for key in sorted(data.files):
+            name, _, _ = key.rpartition("_")
+            parts.setdefault(name, []).append(data[key])
+    return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+def bufferChunks(buffer, fields, chunkRows=10000, startSeq=None, endSeq=None):
+    """(times, values) chunks of a RollingBuffer's samples from startSeq up to endSeq, as far as they are still buffered.
+
+    Safe to run beside ingest: a chunk whose oldest samples were overwritten
+    while it was copied loses just those samples.
+    """
+    endSeq = buffer.head if endSeq is None else min(endSeq, buffer.head)
+    first = max(buffer.head - buffer.length, startSeq or 0)
+    columns = [buffer.schema.index.get(field) for field in fields]
+    while first < endSeq:
+        # Anything older than the ring has been overwritten since the last chunk
+        first = max(first, buffer.head - buffer.size)
+        last = min(first + chunkRows, endSeq)
+        positions = np.arange(first, last) % buffer.size
+        times = buffer.times[positions]
+        values = np.full((len(positions), len(fields)), np.nan)
+        for i, idx in enumerate(columns):
+            if idx is not None and idx < len(buffer.columns):
+                values[:, i] = buffer.columns[idx][positions]
+        overwritten = buffer.head - buffer.size - first
+        if overwritten > 0:
+            times = times[overwritten:]
+            values = values[overwritten:]
+        if len(times):
+            yield times, values
+        first = last
+
+def rowsToValues(rows, columns):
+    """Matrix of the given schema columns of a list of rows, NaN where a row is too short
+    """
+    values = np.full((len(rows), len(columns)), np.nan)
+    for n, row in enumerate(rows):
+        width = len(row)
+        values[n] = [row[idx] if idx < width else np.nan for idx in columns]
+    return values
+
+def sessionChunks(path, schema, fields, parse, chunkRows=10000, address=None):
+    """(times, values) chunks of every parsable record of a recording or text capture.
+
+    `parse(rxTime, line)` returns a schema row or None. With `address(line)`,
+    values get one more column after the fields, the sender of each line.
+    """
+    playback = session.SessionPlayback(path)
+    columns = [schema.indexOf(field) for field in fields]
+    times = []
+    rows = []
+    senders = []
+    try:
+        for rxTime, line in playback.records():
+            row = parse(rxTime, line)
+            if not row:
+                continue
+            times.append(rxTime)
+            rows.append(row)
+            if address:
+                sender = address(line)
+                senders.append(np.nan if sender is None else sender)
+            if len(rows) == chunkRows:
+                yield _chunk(times, rows, columns, senders if address else None)
+                times, rows, senders = [], [], []
+        if rows:
+            yield _chunk(times, rows, columns, senders if address else None)
+    finally:
+        playback.close()
+
+def _chunk(times, rows, columns, senders):
+    values = rowsToValues(rows, columns)
+    if senders is not None:
+        values = np.column_stack([values, senders])
+    return np.array(times), values
+
+def exportChunks(path, fields, chunks, progress=None):
+    """Write every chunk to `path`, returns {"rows", "bytes", "seconds"}. `progress(rows)` is called after each chunk
+    """
+    start = time.perf_counter()
+    writer = openWriter(path, fields)
+    rows = 0
+    try:
+        for times, values in chunks:
+            writer.write(times, values)
+            rows += len(times)
+            if progress:
+                progress(rows)
+    finally:
+        writer.close()
+    return {"rows": rows, "bytes": os.path.getsize(path), "seconds": time.perf_counter() - start}
+
+class LiveExport(Thread):
+    """Writes one source's samples to a CSV file as they are ingested.
+
+    add() runs on the ingest path and only queues the tick's rows. This thread
+    turns them into chunks and writes and flushes them once `chunkRows` have
+    gathered or `flushDelay` seconds have passed, so a crash loses at most
+    that much. Ticks that find the queue full are dropped and counted, ingest
+    never waits on the disk. The first len(fields) schema columns are written,
+    fields that appear later are not.
+
+    If writing fails, the error is kept in `error` and passed to `onError`
+    from this thread, the thread ends and add() ignores anything after that.
+    """
+    def __init__(self, path, fields, chunkRows=10000, flushDelay=5.0, queueSize=10000, onError=None):
+        super().__init__(daemon=True)
+        if not path.lower().endswith(".csv"):
+            raise ValueError("Live export writes CSV, .npz and Parquet files are only readable once closed")
+        self.path = path
+        self.fields = list(fields)
+        self.chunkRows = chunkRows
+        self.flushDelay = flushDelay
+        self.queue = queue.Queue(queueSize)
+        self.writer = openWriter(path, self.fields)
+        self.rows = 0
+        self.dropped = 0
+        self.error = None
+        self.onError = onError
+
+    def add(self, times, rows):
+        if self.error:
+            return
+        try:
+            self.queue.put_nowait((times, rows))
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def close(self):
+        # A writer that failed has stopped reading the queue, so never wait for room in it
+        while self.is_alive():
+            try:
+                self.queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.join()
+
+    def _write(self, times, rows):
+        self.writer.write(np.array(times), rowsToValues(rows, range(len(self.fields))))
+        self.writer.flush()
+        self.rows += len(rows)
+
+    def run(self):
+        times = []
+        rows = []
+        deadline = time.monotonic() + self.flushDelay
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    times.extend(item[0])
+                    rows.extend(item[1])
+                if rows and (len(rows) >= self.chunkRows or time.monotonic() >= deadline):
+                    self._write(times, rows)
+                    times, rows = [], []
+                if time.monotonic() >= deadline:
+                    deadline = time.monotonic() + self.flushDelay
+            if rows:
+                self._write(times, rows)
+        except (OSError, ValueError) as e:
+            self.error = e
+            if self.onError:
+                self.onError(e)
+        finally:
+            try:
+                self.writer.close()
+            except OSError as e:
+                self.error = self.error or e
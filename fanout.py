@@ -0,0 +1,254 @@
+"""Fan-out of parsed telemetry to other instances on the local network.
+
+The instance that owns the radios publishes every batch of samples it ingests
+on a TCP port. Any number of other instances subscribe by giving a source the
+port tcp://<host>:<port> in place of a serial port, so the pit wall, an
+engineer's laptop and a big screen can all watch the same cars.
+
+Each message is a 4 byte big-endian length followed by UTF-8 JSON:
+
+    {"source": "Car", "fields": ["FUEL", "RPM", ...], "times": [ms, ...], "rows": [[...], ...]}
+
+Rows are indexed like `fields`, missing samples are NaN. The field names come
+with every batch, so a subscriber can join at any time and never depends on
+the publisher's column order.
+
+Every subscriber has a bounded queue and a sender thread of its own.
+publish() encodes a batch once and appends it to each queue, so a slow or
+stalled subscriber loses its oldest batches and never holds up ingest.
+
+Run `python fanout.py tcp://<host>:<port>` to watch what a publisher sends.
+"""
+import json
+import socket
+import struct
+import sys
+import time
+from collections import deque
+from threading import Condition, Lock, Thread
+
+header = struct.Struct(">I")
+# A batch is a single ingest tick of one source, anything this large is not one
+maxMessageBytes = 16 * 1024 * 1024
+scheme = "tcp://"
+
+def parseAddress(url):
+    """(host, port) of a tcp://host:port address
+    """
+    if not url.startswith(scheme):
+        raise ValueError(f"{url} is not a {scheme} address")
+    host, _, port = url[len(scheme):].rpartition(":")
+    return host, int(port)
+
+def encodeBatch(source, fields, times, rows):
+    payload = json.dumps({"source": source, "fields": fields, "times": times, "rows": rows},
+                         separators=(",", ":")).encode()
+    return header.pack(len(payload)) + payload
+
+class _Client(Thread):
+    """One subscriber connection and the messages waiting to be sent to it
+    """
+    def __init__(self, sock, address, queueSize):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.address = address
+        self.pending = deque(maxlen=queueSize)
+        self.ready = Condition()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, message):
+        with self.ready:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(message)
+            self.ready.notify()
+
+    def depth(self):
+        return len(self.pending)
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        try:
+            # Wakes a sendall stuck on a subscriber that stopped reading
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def run(self):
+        try:
+            while True:
+                with self.ready:
+                    while not self.pending and not self.closed:
+                        self.ready.wait()
+                    if self.closed:
+                        return
+                    messages = list(self.pending)
+                    self.pending.clear()
+                # Everything that queued up while the last send was in progress goes out in one write
+                self.sock.sendall(b"".join(messages))
+                self.sent += len(messages)
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+            self.sock.close()
+
+class Publisher(Thread):
+    """Accepts subscribers on a TCP port and sends each of them every published batch.
+
+    `port` 0 picks a free port, the one chosen is in self.port.
+    """
+    def __init__(self, host, port, queueSize=256, acceptTimeout=0.5):
+        super().__init__(daemon=True)
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(acceptTimeout)
+        self.port = self.server.getsockname()[1]
+        self.queueSize = queueSize
+        self.clients = []
+        self.lock = Lock()
+        self.stopped = False
+        self.published = 0
+
+    def run(self):
+        while not self.stopped:
+            try:
+                sock, address = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock, address, self.queueSize)
+            client.start()
+            with self.lock:
+                self.clients.append(client)
+        self.server.close()
+
+    def close(self):
+        self.stopped = True
+        self.join()
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+
+    def subscribers(self):
+        with self.lock:
+            self.clients = [client for client in self.clients if not client.closed]
+            return list(self.clients)
+
+    def publish(self, source, fields, times, rows):
+        """Queue a batch for every subscriber, never blocks on the network
+        """
+        clients = self.subscribers()
+        if not clients:
+            return
+        message = encodeBatch(source, fields, times, rows)
+        for client in clients:
+            client.push(message)
+        self.published += 1
+
+class Subscriber(Thread):
+    """Receives batches from a Publisher, reconnecting every `retryDelay` seconds while it cannot reach it.
+
+    onBatch(source, fields, times, rows) is called from this thread.
+    """
+    def __init__(self, host, port, onBatch, retryDelay=1.0, readTimeout=0.1):
+        super().__init__(daemon=True)
+        self.host = host
+        self.tcpPort = port
+        self.onBatch = onBatch
+        self.retryDelay = retryDelay
+        self.readTimeout = readTimeout
+        self.stopped = False
+        self.connected = False
+        self.received = 0
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        while not self.stopped:
+            try:
+                with socket.create_connection((self.host, self.tcpPort), timeout=self.retryDelay) as sock:
+                    sock.settimeout(self.readTimeout)
+                    self.connected = True
+                    self._receive(sock)
+            except (OSError, ValueError):
+                pass
+            self.connected = False
+            deadline = time.monotonic() + self.retryDelay
+            while not self.stopped and time.monotonic() < deadline:
+                time.sleep(self.readTimeout)
+
+    def _receive(self, sock):
+        pending = bytearray()
+        while not self.stopped:
+            try:
+                chunk = sock.recv(1 << 16)
+            except socket.timeout:
+                continue
+            if not chunk:
+                return
+            pending += chunk
+            start = 0
+            while len(pending) - start >= header.size:
+                length, = header.unpack_from(pending, start)
+                if length > maxMessageBytes:
+                    raise ValueError(f"{length} byte message")
+                end = start + header.size + length
+                if end > len(pending):
+                    break
+                message = json.loads(pending[start + header.size:end])
+                start = end
+                self.received += 1
+                self.onBatch(message["source"], message["fields"], message["times"], message["rows"])
+            if start:
+                del pending[:start]
+
+def watch(url, seconds=None, out=sys.stdout):
+    """Print batches and samples per second received from a publisher, returns totals and latency percentiles.
+
+    Latency is receive time minus the newest sample's time in each batch, only
+    meaningful when both ends share a clock.
+    """
+    totals = {"batches": 0, "rows": 0}
+    latencies = []
+    def onBatch(source, fields, times, rows):
+        totals["batches"] += 1
+        totals["rows"] += len(rows)
+        if times:
+            latencies.append(time.time() * 1000 - times[-1])
+    host, port = parseAddress(url)
+    subscriber = Subscriber(host, port, onBatch)
+    subscriber.start()
+    start = time.monotonic()
+    last = dict(totals)
+    try:
+        while seconds is None or time.monotonic() - start < seconds:
+            time.sleep(1)
+            print(f"{totals['batches'] - last['batches']} batches/s, {totals['rows'] - last['rows']} samples/s",
+                  file=out, flush=True)
+            last = dict(totals)
+    except KeyboardInterrupt:
+        pass
+    subscriber.stop()
+    subscriber.join()
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] if latencies else float("nan")
+    return {**totals, "p50Ms": pick(50), "p99Ms": pick(99)}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python fanout.py tcp://<host>:<port> [seconds] [--json]")
+        sys.exit(2)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != "--json" else None
+    if "--json" in sys.argv:
+        print(json.dumps(watch(sys.argv[1], seconds, sys.stderr)))
+    else:
+        print(watch(sys.argv[1], seconds))
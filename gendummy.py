@@ -1,5 +1,7 @@
 import random
 import math
+import sys
+import telemframe
 
 i = 0
 count = 1000
@@ -15,6 +17,15 @@ def pack(data):
     s+="\n"
     return s
 
+def packLora(data, address=101):
+    """TELEM packet wrapped the way the field side modem delivers it
+    """
+    payload = pack(data).strip().encode()
+    return b"+RCV=%d,%d,%s,-40,12\r\n" % (address, len(payload), payload)
+
+def packFrame(data):
+    return telemframe.encodeFrame(data, i)
+
 def iterToTime(i):
     return (i * delay) / 1000
 
@@ -42,6 +53,32 @@ def getDummyData():
         "BV": 11.8 + tri(t, 0.4, 0.25),
     }
 
-with open("dummy.txt", "w") as f:
-    for x in range(0,count):
-        f.write(pack(getDummyData()))
\ No newline at end of file
+def fieldName(n):
+    # Field names can only contain letters
+    name = ""
+    while True:
+        name = chr(ord("A") + n % 26) + name
+        n = n // 26 - 1
+        if n < 0:
+            return "CH" + name
+
+def getWideDummyData(fieldCount):
+    """getDummyData padded with extra synthetic channels up to `fieldCount` fields, for load testing
+    """
+    data = getDummyData()
+    t = iterToTime(i)
+    for n in range(fieldCount - len(data)):
+        data[fieldName(n)] = sine(t, 100 + n, 0.05 * (n + 1))
+    return data
+
+if __name__ == "__main__":
+    if "--binary" in sys.argv:
+        # Binary frames wrapped the way the field side modem delivers them
+        with open("dummy.bin", "wb") as f:
+            for x in range(0,count):
+                frame = packFrame(getDummyData())
+                f.write(b"+RCV=101,%d,%s,-40,12\r\n" % (len(frame), frame))
+    else:
+        with open("dummy.txt", "w") as f:
+            for x in range(0,count):
+                f.write(pack(getDummyData()))
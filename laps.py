@@ -0,0 +1,173 @@
+"""Lap detection from the GPS stream and a per-lap statistics index.
+
+A lap starts whenever the car's path crosses the start/finish gate of the
+current region, a line segment between two (lat, lon) points. Crossings
+against the direction of the first one, or sooner than `minLapMs` after the
+last, are ignored. Samples before the first crossing form lap 0, the out lap,
+which has no lap time.
+
+Every lap keeps its range of buffer sequence numbers, its start and end time
+and a running min/max/sum/count per schema column, so comparing laps never
+goes back to the raw samples.
+"""
+import math
+
+def gateCrossing(p0, p1, a, b):
+    """Where the step p0 -> p1 crosses the gate a-b, as (fraction along the step, side crossed to), or None
+    """
+    rx = p1[0] - p0[0]
+    ry = p1[1] - p0[1]
+    sx = b[0] - a[0]
+    sy = b[1] - a[1]
+    denom = rx * sy - ry * sx
+    if denom == 0:
+        return None
+    qx = a[0] - p0[0]
+    qy = a[1] - p0[1]
+    t = (qx * sy - qy * sx) / denom
+    u = (qx * ry - qy * rx) / denom
+    # A fix exactly on the gate counts for the step that reaches it, not the one leaving it
+    if 0 < t <= 1 and 0 <= u <= 1:
+        return t, 1 if denom > 0 else -1
+    return None
+
+class Lap():
+    """Sample range, timing and per-column statistics of one lap.
+
+    endSeq and endTime are None while the lap is in progress. getMin/getAvg/getMax
+    take field names like RollingBuffer's, so either can back a stat display.
+    """
+    def __init__(self, schema, number, startSeq, startTime, timed):
+        self.schema = schema
+        self.number = number
+        self.startSeq = startSeq
+        self.endSeq = None
+        self.startTime = startTime
+        self.endTime = None
+        # False for the out lap, which did not start at the gate
+        self.timed = timed
+        # Plain lists, a row is only ever a dozen or so columns and numpy's per call overhead would dominate
+        self.mins = []
+        self.maxs = []
+        self.sums = []
+        self.counts = []
+
+    def add(self, row):
+        if len(row) > len(self.counts):
+            grow = len(row) - len(self.counts)
+            self.mins.extend([math.inf] * grow)
+            self.maxs.extend([-math.inf] * grow)
+            self.sums.extend([0.0] * grow)
+            self.counts.extend([0] * grow)
+        mins = self.mins
+        maxs = self.maxs
+        sums = self.sums
+        counts = self.counts
+        for idx, value in enumerate(row):
+            if value != value: # NaN
+                continue
+            if value < mins[idx]:
+                mins[idx] = value
+            if value > maxs[idx]:
+                maxs[idx] = value
+            sums[idx] += value
+            counts[idx] += 1
+
+    def close(self, endSeq, endTime):
+        self.endSeq = endSeq
+        self.endTime = endTime
+
+    def lapTime(self):
+        """Lap time in ms, None for the out lap and the lap in progress
+        """
+        if not self.timed or self.endTime is None:
+            return None
+        return self.endTime - self.startTime
+
+    def elapsed(self, now):
+        return (self.endTime if self.endTime is not None else now) - self.startTime
+
+    def _index(self, key):
+        idx = self.schema.index.get(key)
+        if idx is None or idx >= len(self.counts) or not self.counts[idx]:
+            return None
+        return idx
+
+    def version(self, key):
+        """Changes whenever the stats of `key` may have, like RollingBuffer.version
+        """
+        idx = self.schema.index.get(key)
+        return self.counts[idx] if idx is not None and idx < len(self.counts) else None
+
+    def getMin(self, key):
+        idx = self._index(key)
+        return None if idx is None else self.mins[idx]
+
+    def getAvg(self, key):
+        idx = self._index(key)
+        return None if idx is None else self.sums[idx] / self.counts[idx]
+
+    def getMax(self, key):
+        idx = self._index(key)
+        return None if idx is None else self.maxs[idx]
+
+class LapIndex():
+    """Splits the sample stream into laps as it is ingested.
+
+    add() is called once per sample with its buffer sequence number and, for
+    samples with a fix, the position in decimal degrees.
+    """
+    def __init__(self, schema, gate=None, minLapMs=20000):
+        self.schema = schema
+        self.minLapMs = minLapMs
+        self.laps = []
+        self.bestLap = None
+        self.setGate(gate)
+
+    def setGate(self, gate):
+        self.gate = gate
+        self.direction = None
+        self.lastPosition = None
+        self.lastTime = None
+
+    def current(self):
+        return self.laps[-1] if self.laps else None
+
+    def last(self):
+        """The most recently finished lap
+        """
+        return self.laps[-2] if len(self.laps) > 1 else None
+
+    def best(self):
+        return self.bestLap
+
+    def lap(self, number):
+        return self.laps[number] if 0 <= number < len(self.laps) else None
+
+    def _startLap(self, seq, t, timed):
+        current = self.current()
+        if current:
+            current.close(seq, t)
+            lapTime = current.lapTime()
+            if lapTime is not None and (self.bestLap is None or lapTime < self.bestLap.lapTime()):
+                self.bestLap = current
+        self.laps.append(Lap(self.schema, len(self.laps), seq, t, timed))
+
+    def add(self, seq, t, row, position=None):
+        if position is not None:
+            if self.gate and self.lastPosition is not None:
+                hit = gateCrossing(self.lastPosition, position, *self.gate)
+                if hit:
+                    fraction, side = hit
+                    if self.direction is None:
+                        self.direction = side
+                    # Interpolate between fixes, a 20 Hz fix rate alone would put laps off by up to 50 ms
+                    crossTime = float(self.lastTime + fraction * (t - self.lastTime))
+                    current = self.current()
+                    if side == self.direction and (not current.timed or crossTime - current.startTime >= self.minLapMs):
+                        self._startLap(seq, crossTime, True)
+            self.lastPosition = position
+            self.lastTime = t
+        if not self.laps:
+            self._startLap(seq, t, False)
+        self.laps[-1].add(row)
@@ -1,16 +1,32 @@
 import matplotlib
+import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import ttk 
 import math
+from collections import deque
 import re
 import json
+import os
+import logging
+import logging.handlers
+import queue
 import serial
-from threading import Thread
+from threading import Lock, Thread
 import time
 import tkintermapview
+import telemframe
+import session
+import tilecache
+import track
+import laps
+import derived
+import analysis
+import diagnostics
+import fanout
+import export
 import serial.tools.list_ports
 
 matplotlib.use("TkAgg")
@@ -30,6 +46,10 @@ expectedFields = [
     "LAT",
     "LON"
 ]
+# Channels computed from other fields as each packet arrives, see derived.py. A layout config can replace them.
+derivedChannels = {
+    "Slope": "-degrees(atan2(ACCZ, -ACCX))"
+}
 fieldUnits = {
     "FUEL": "MPG",
     "RPM": "RPM",
@@ -39,10 +59,38 @@ fieldUnits = {
     "BV": "V"
 }
 
-port = "/dev/ttyUSB0"
 baudrate = 115200
+# Window spans offered when analysing a recording, None shows all of it
+analysisSpans = {"10s": 10000, "1m": 60000, "5m": 60000*5, "30m": 60000*30, "2h": 3600000*2, "All": None}
+# Playback speeds offered for replays, None replays as fast as the UI keeps up
+replaySpeeds = {"1x": 1, "10x": 10, "max": None}
+# Every raw line received is appended to a session recording in this directory, None disables recording
+recordDirectory = "sessions"
+# File > Export and live export write into this directory
+exportDirectory = "exports"
+# Write every source's samples to a CSV file in exportDirectory while running, File > Live Export switches it later
+liveExport = False
+# Largest payload the LoRa modem delivers in one +RCV= line
+maxLoraPayload = 240
+# Bytes without a newline after which a serial stream is taken to be noise and dropped up to the next line
+maxLineBytes = 1024
+# Longest a serial read blocks while the link is quiet, also bounds shutdown latency
+serialReadTimeout = 0.05
 fieldLoraAddress = 100
 carLoraAddress = 101
+# Telemetry sources by name: the serial port of a receiver and the LoRa address of the car sending to it, None takes
+# any address. Sources on the same port share its reader, which routes each +RCV= line by sender address. A backup
+# receiver hearing the same car is a source of its own. Every source keeps its own buffer, laps and track.
+sourceConfig = {
+    "Car": {"port": "/dev/ttyUSB0", "address": carLoraAddress}
+}
+# Publish every ingested sample on this TCP port for other instances on the local network, None disables it.
+# They subscribe by giving a source the port "tcp://<this laptop>:<publishPort>", see fanout.py. A network source
+# takes the published source of the same name, or with address None any published source.
+publishPort = None
+publishHost = "0.0.0.0"
+# Batches queued for each subscriber before its oldest are dropped, at one batch per ingest tick about 12 s
+publishQueueSize = 256
 
 # *SF7to SF9 at 125kHz, SF7 to SF10 at 250kHz, and SF7 to SF11 at 500kHz
 loraSpreadFactor = 7
@@ -57,83 +105,443 @@ mapRegions = {
     "Burke": [(42.119826,-79.980805), (42.118107,-79.979292)]
 }
 region = "Indianapolis Speedway"
+# Start/finish line of each region as two (lat, lon) points, a lap starts every time the car crosses it.
+# These are rough placements across the main straight, survey the real line on site.
+lapGates = {
+    "Indianapolis Speedway": [(39.79300, -86.23950), (39.79300, -86.23830)],
+    "Burke": [(42.11897, -79.98085), (42.11897, -79.97929)]
+}
+# Crossings sooner than this after the start of a lap are GPS jitter, not a new lap
+minLapMs = 20000
+# Map tiles are drawn from this database, fill it with `python tilecache.py` or File > Prefetch Map Tiles while online
+mapTileDatabase = "tiles.db"
+# Tiles are fetched from this server, also settable in a layout config. Prefetching needs one whose usage policy
+# allows bulk downloads, the public OpenStreetMap servers do not, see tilecache.py
+mapTileServer = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+# E-mail address or URL sent in the User-Agent of tile downloads, prefetching refuses to run without one
+mapTileContact = None
+mapMaxZoom = 19
+# Extra tiles prefetched around each region, so the edges stay drawn when zoomed out or panned
+mapTileMargin = 2
+# Never request tiles from mapTileServer while drawing, missing tiles stay blank
+mapOfflineOnly = True
+# GPS track: positions per redrawn chunk, Douglas-Peucker tolerance (m) for older chunks and the canvas point budget
+trackChunkSize = 500
+trackTolerance = 1.0
+trackMaxPoints = 5000
 
 # Not configurable.
 timeOptionLabels = ["1s", "5s", "10s", "15s", "30s", "1m", "5m", "10m", "30m"]
 timeOptionMS = [1000, 5000, 10000, 15000, 30000, 60000, 60000*5, 60000*10, 60000*30]
+lapWindowLabels = ["This lap", "Last lap"]
+# Track colour of each source on the map, in sourceConfig order
+sourceColors = ["#3E69CB", "#CB3E3E", "#3ECB5A", "#CB8F3E"]
+# Sources for the MIN/AVG/MAX of the stat overview
+statWindows = ["Buffer", "This lap", "Last lap", "Best lap"]
 maxBufferLength = round(60000 * 60 / expectedPacketDelay)
 displayRefreshDelay = 200
+# How often the stat overview refreshes, tiles whose field has no new samples are skipped
+statRefreshDelay = 100
+# Log console: lines kept in the widget, and waiting for it, and how often the widget is updated
+logMaxLines = 500
+logFlushDelay = 250
+# Raw packet echo in the log console is "off", "all" or "sampled", which shows one in every rawEchoSampleEvery
+rawEchoModes = ["off", "sampled", "all"]
+rawEchoSampleEvery = 20
+logLevels = {"RAW": 5, "INFO": logging.INFO, "WARN": logging.WARNING, "ERROR": logging.ERROR}
+logging.addLevelName(logLevels["RAW"], "RAW")
+# Mirror the log console to this rotating file, None disables it
+logFile = None
+logFileBytes = 10 * 1024 * 1024
+logFileBackups = 5
+# Time every stage from the radio to the screen from startup, File > Diagnostics can switch it on later as well
+diagnosticsEnabled = False
+# Packets that took longer than this from being received to being in the buffer count as late
+diagnosticsLateMs = 250
+# How often the Tk main loop drains packets queued by the reader thread
+ingestDrainDelay = 50
+# Packets the reader thread can queue ahead of the UI before they are dropped
+ingestQueueSize = 10000
+# (bucket ms, bucket count) for each downsampled history tier kept by RollingBuffer
+summaryTiers = [(500, 2 * 3600 * 4), (5000, 720 * 24)]
 
 activePopup = None
-mainBuffer = None
-serialThread = None
+mainSchema = None
+# TelemetrySource by name, and the AsyncSerial reading each port
+sources = {}
+serialThreads = {}
+publisher = None
+# LiveExport of each source while live export is on
+liveExports = {}
+# parse: reader thread, queue: received to drained, apply: derived channels, buffer and laps,
+# on screen: age of the newest sample of a source once the graphs have drawn it
+timings = diagnostics.StageTimings(["parse", "queue", "apply", "graphs", "overview", "map", "on screen"], diagnosticsEnabled)
+replayThread = None
+recorder = None
 logInfo = None
 statContainer = None
 
-def getPacketLimit(option):
-    """Get packet # limit when given a selected timeOptionLabel
+def displayFields():
+    """Fields offered in graphs and the stat overview: the expected ones, then derived channels
+    """
+    return expectedFields + [name for name in derivedChannels if name not in expectedFields]
+
+def getWindowMS(option):
+    """Get the time span in ms for a selected timeOptionLabel, None means the whole buffer
     """
     if option is None:
-        return 0
-    idx = timeOptionLabels.index(option)
-    avg = mainBuffer.getAvg("delta")
-    return round(timeOptionMS[idx] / avg)
+        return maxBufferLength * expectedPacketDelay
+    return timeOptionMS[timeOptionLabels.index(option)]
+
+
+class WindowStats():
+    """Incrementally maintained min/avg/max over a sliding window of samples.
 
+    Uses a running sum/count for the average and monotonic deques of (seq, value)
+    for the min and max, so every push/evict is amortized O(1).
+    """
+    def __init__(self):
+        self.sum = 0.0
+        self.count = 0
+        self.seen = False
+        self.minq = deque()
+        self.maxq = deque()
+
+    def push(self, seq, value):
+        self.sum += value
+        self.count += 1
+        minq = self.minq
+        while minq and minq[-1][1] >= value:
+            minq.pop()
+        minq.append((seq, value))
+        maxq = self.maxq
+        while maxq and maxq[-1][1] <= value:
+            maxq.pop()
+        maxq.append((seq, value))
+
+    def evict(self, seq, value):
+        self.count -= 1
+        if self.count == 0:
+            # Drop any accumulated float error once the window is empty
+            self.sum = 0.0
+        else:
+            self.sum -= value
+        if self.minq and self.minq[0][0] == seq:
+            self.minq.popleft()
+        if self.maxq and self.maxq[0][0] == seq:
+            self.maxq.popleft()
+
+    def getMin(self):
+        return self.minq[0][1] if self.count else None
+
+    def getAvg(self):
+        return self.sum / self.count if self.count else None
+
+    def getMax(self):
+        return self.maxq[0][1] if self.count else None
+
+def ringTail(ring, head, count):
+    """Last `count` slots of a ring whose next write index is head % len(ring).
+
+    Returns a view unless the range wraps around the end of the ring.
+    """
+    size = len(ring)
+    end = head % size or size
+    start = end - count
+    if start >= 0:
+        return ring[start:end]
+    return np.concatenate((ring[start:], ring[:end]))
+
+def ringCountSince(times, head, length, sinceMs):
+    """Number of newest entries of a sorted time ring with a timestamp >= sinceMs, by binary search
+    """
+    if sinceMs is None:
+        return length
+    size = len(times)
+    end = head % size or size
+    start = end - length
+    if start >= 0:
+        return end - int(np.searchsorted(times[start:end], sinceMs))
+    older = times[start:]
+    newer = times[:end]
+    if newer[0] < sinceMs:
+        return end - int(np.searchsorted(newer, sinceMs))
+    return end + len(older) - int(np.searchsorted(older, sinceMs))
+
+class FieldSchema():
+    """Maps field names to stable column indices.
+
+    Seeded with the expected fields and extended whenever a packet carries a field
+    we have not seen yet. Rows are plain lists of floats indexed by these columns,
+    with NaN for fields missing from a packet. Reader threads of every source
+    share one schema, so new fields are added under a lock.
+    """
+    def __init__(self, fields):
+        self.names = []
+        self.index = {}
+        self.byteIndex = {}
+        self.lock = Lock()
+        for field in fields:
+            self.indexOf(field)
+
+    def __len__(self):
+        return len(self.names)
+
+    def indexOf(self, name):
+        idx = self.index.get(name)
+        if idx is None:
+            with self.lock:
+                idx = self.index.get(name)
+                if idx is None:
+                    idx = len(self.names)
+                    self.names.append(name)
+                    self.byteIndex[name.encode()] = idx
+                    self.index[name] = idx
+        return idx
+
+    def toRow(self, values):
+        row = [math.nan] * len(self.names)
+        for key, value in values.items():
+            if value is None:
+                continue
+            idx = self.indexOf(key)
+            if idx >= len(row):
+                row.extend([math.nan] * (idx + 1 - len(row)))
+            row[idx] = value
+        return row
+
+    def get(self, row, name):
+        """Value of a field in a row, or None if it is missing
+        """
+        idx = self.index.get(name)
+        if idx is None or idx >= len(row):
+            return None
+        value = row[idx]
+        return None if value != value else value
+
+class SummaryTier():
+    """Ring of fixed-width time buckets holding min/max/sum/count per column.
+
+    Buckets are filled as samples arrive, so long windows can be drawn without
+    touching raw samples. Once `capacity` buckets exist the oldest is overwritten.
+    """
+    def __init__(self, bucketMs, capacity):
+        self.bucketMs = bucketMs
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        # Start time of each bucket in ms
+        self.times = np.zeros(self.capacity)
+        self.columns = []
+        self.head = 0
+        self.length = 0
+        self.bucket = None
+
+    def _addColumn(self):
+        cap = self.capacity
+        self.columns.append((np.full(cap, np.nan), np.full(cap, np.nan), np.zeros(cap), np.zeros(cap)))
+
+    def add(self, row, t):
+        bucket = t // self.bucketMs
+        if bucket != self.bucket:
+            self.bucket = bucket
+            pos = self.head % self.capacity
+            self.times[pos] = bucket * self.bucketMs
+            for mins, maxs, sums, counts in self.columns:
+                mins[pos] = np.nan
+                maxs[pos] = np.nan
+                sums[pos] = 0
+                counts[pos] = 0
+            self.head += 1
+            if self.length < self.capacity:
+                self.length += 1
+        while len(self.columns) < len(row):
+            self._addColumn()
+        pos = (self.head - 1) % self.capacity
+        for idx, value in enumerate(row):
+            if value != value:
+                continue
+            mins, maxs, sums, counts = self.columns[idx]
+            if counts[pos]:
+                if value < mins[pos]:
+                    mins[pos] = value
+                if value > maxs[pos]:
+                    maxs[pos] = value
+            else:
+                mins[pos] = value
+                maxs[pos] = value
+            sums[pos] += value
+            counts[pos] += 1
+
+    def getWindow(self, idx, sinceMs=None):
+        """Get (times, mins, maxs, means) for buckets of column `idx` overlapping the window starting at sinceMs
+        """
+        if sinceMs is not None:
+            # Include the bucket sinceMs falls in
+            sinceMs -= self.bucketMs
+        count = ringCountSince(self.times, self.head, self.length, sinceMs)
+        if not count or idx is None or idx >= len(self.columns):
+            return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+        mins, maxs, sums, counts = (ringTail(a, self.head, count) for a in self.columns[idx])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return ringTail(self.times, self.head, count), mins, maxs, means
 
 class RollingBuffer():
-    def __init__(self, size):
-        self.buffer = []
+    """Fixed-size columnar ring buffer.
+
+    Each schema column gets its own preallocated float64 ring of `size` slots.
+    Missing samples are stored as NaN, so every column stays aligned with the
+    packet index.
+    """
+    def __init__(self, size, schema=None):
         self.size = size
-        self.max = {}
-        self.min = {}
-        self.average = {}
-        self.seenKeys = {}
+        self.schema = schema or FieldSchema(expectedFields)
+        self.reset()
 
     def reset(self):
-        self.buffer = []
-        self.max = {}
-        self.min = {}
-        self.average = {}
+        # Receive time of each sample in ms, non-decreasing in insertion order
+        self.times = np.zeros(self.size)
+        self.columns = []
+        self.stats = []
+        # (seq, value) of the newest non-missing sample per column
+        self.last = []
         self.seenKeys = {}
+        self.tiers = [SummaryTier(ms, capacity) for ms, capacity in summaryTiers]
+        # Total samples ever added, doubles as the sequence number of the next sample
+        self.head = 0
+        self.length = 0
+
+    def _addColumn(self):
+        self.columns.append(np.full(self.size, np.nan))
+        self.stats.append(WindowStats())
+        self.last.append((-1, None))
+
+    def add(self, values, t=None):
+        """Append one packet given as a {field: value} dict, see addRow
+        """
+        self.addRow(self.schema.toRow(values), t)
+
+    def addRow(self, row, t=None):
+        """Append one schema-indexed row, stamped with receive time `t` in ms (defaults to now)
+        """
+        if t is None:
+            t = time.time() * 1000
+        while len(self.columns) < len(row):
+            self._addColumn()
+        seq = self.head
+        pos = seq % self.size
+        if self.length:
+            # Keep the time column sorted even if the wall clock steps backwards
+            t = max(t, self.times[(seq - 1) % self.size])
+        self.times[pos] = t
+        evictSeq = seq - self.size
+        rowLength = len(row)
+        for idx, col in enumerate(self.columns):
+            stats = self.stats[idx]
+            if evictSeq >= 0:
+                old = col[pos]
+                if old == old: # not NaN
+                    stats.evict(evictSeq, old)
+            value = row[idx] if idx < rowLength else math.nan
+            col[pos] = value
+            if value == value:
+                stats.push(seq, value)
+                self.last[idx] = (seq, value)
+                if not stats.seen:
+                    stats.seen = True
+                    self.seenKeys[self.schema.names[idx]] = True
+        self.head += 1
+        if self.length < self.size:
+            self.length += 1
+        for tier in self.tiers:
+            tier.add(row, t)
+
+    def _index(self, key):
+        idx = self.schema.index.get(key)
+        if idx is None or idx >= len(self.columns):
+            return None
+        return idx
 
-    def _checkTrim(self):
-        if len(self.buffer) > self.size:
-            self.buffer.pop(0)
-    
-    def _updateStats(self):
-        for key in self.seenKeys:
-            buff = [i for i in self.get(key) if i is not None]
-            self.max[key] = max(buff)
-            self.min[key] = min(buff)
-            s = sum(buff)
-            self.average[key] = s / len(buff)
-        # self.max = max(self.buffer)
-        # self.min = min(self.buffer)
-        # s = sum(self.buffer)
-        # self.average = s / len(self.buffer)
-
-    def add(self, values):
-        self.buffer.append(values)
-        for key in values:
-            self.seenKeys[key] = True
-        self._checkTrim()
-        self._updateStats()
-    
     def get(self, key, count=0):
-        count = count or 0
-        return [d.get(key) for d in self.buffer[-count:]]
+        count = min(count or self.length, self.length)
+        idx = self._index(key)
+        if idx is None:
+            return np.full(count, np.nan)
+        return ringTail(self.columns[idx], self.head, count)
     
+    def getWindow(self, key, sinceMs=None):
+        """Get (times, values) for every sample of `key` received at or after sinceMs
+        """
+        count = ringCountSince(self.times, self.head, self.length, sinceMs)
+        if not count:
+            return np.empty(0), np.empty(0)
+        return ringTail(self.times, self.head, count), self.get(key, count)
+
+    def getRange(self, key, startSeq, endSeq=None):
+        """Get (times, values) for samples startSeq up to endSeq (exclusive, None for the newest), as far as they are still buffered
+        """
+        endSeq = self.head if endSeq is None else min(endSeq, self.head)
+        startSeq = max(startSeq, self.head - self.length)
+        count = endSeq - startSeq
+        if count <= 0:
+            return np.empty(0), np.empty(0)
+        back = self.head - startSeq
+        return ringTail(self.times, self.head, back)[:count], self.get(key, back)[:count]
+
+    def getEnvelope(self, key, sinceMs, nowMs, minBuckets):
+        """Get a (times, values) min/max envelope for the window from `sinceMs` to `nowMs`.
+
+        Reads from the coarsest summary tier that still has at least `minBuckets`
+        buckets in the window, falling back to raw samples for short windows.
+        `nowMs` is on the caller's clock, which for a replay is not the wall clock.
+        """
+        span = nowMs - sinceMs
+        for tier in reversed(self.tiers):
+            if span / tier.bucketMs >= minBuckets:
+                times, mins, maxs, _ = tier.getWindow(self.schema.index.get(key), sinceMs)
+                outTimes = np.repeat(times, 2)
+                outValues = np.empty(len(outTimes))
+                outValues[0::2] = mins
+                outValues[1::2] = maxs
+                return outTimes, outValues
+        return self.getWindow(key, sinceMs)
+
+    def version(self, key):
+        """Changes whenever getLast or the MIN/AVG/MAX of `key` may have, None for unknown keys
+        """
+        idx = self._index(key)
+        if idx is None:
+            return None
+        # The newest sample's seq only grows, and between new samples evictions only lower the count
+        return self.last[idx][0], self.stats[idx].count
+
     def getLast(self, key):
-        return next((dop for dop in reversed(self.get(key)) if dop is not None), None)
+        idx = self._index(key)
+        if idx is None:
+            return None
+        seq, value = self.last[idx]
+        # Only report values still inside the buffer
+        if seq < self.head - self.length:
+            return None
+        return value
+
+    def _stats(self, key):
+        idx = self._index(key)
+        return None if idx is None else self.stats[idx]
     
     def getMin(self, key):
-        return self.min.get(key)
+        stats = self._stats(key)
+        return stats.getMin() if stats else None
     
     def getAvg(self, key):
-        return self.average.get(key)
+        stats = self._stats(key)
+        return stats.getAvg() if stats else None
     
     def getMax(self, key):
-        return self.max.get(key)
+        stats = self._stats(key)
+        return stats.getMax() if stats else None
 
 class FieldSelectionFrame(tk.Frame):
     def __init__(self, parent, selected=[]):
@@ -145,7 +553,7 @@ class FieldSelectionFrame(tk.Frame):
         self["padx"] = 5
         self.cbs = []
 
-        for i, field in enumerate(expectedFields):
+        for i, field in enumerate(displayFields()):
             cb = ttk.Checkbutton(self, text=field)
             cb.grid(column=0,row=i+1,sticky=(tk.W))
             cb.state(['!selected', '!alternate'])
@@ -162,7 +570,7 @@ class FieldSelectionFrame(tk.Frame):
 
 class TimeFrameSelector(ttk.Combobox):
     def __init__(self, parent, current):
-        ttk.Combobox.__init__(self, parent, state="readonly", values=timeOptionLabels, width=5)
+        ttk.Combobox.__init__(self, parent, state="readonly", values=timeOptionLabels + lapWindowLabels, width=8)
         self.set(current)
 
     def getLimit(self):
@@ -185,6 +593,14 @@ class GraphSettingsPopup(tk.Tk):
 
         self.time = timeCombobox = TimeFrameSelector(self, settings["limit"] or "30m")
         timeCombobox.grid(column=1,row=0)
+
+        self.decimate = ttk.Checkbutton(self, text="Decimate")
+        self.decimate.grid(column=2,row=0)
+        self.decimate.state(['!alternate', 'selected' if settings["decimate"] else '!selected'])
+
+        self.sourceBox = ttk.Combobox(self, state="readonly", values=list(sources.keys()), width=10)
+        self.sourceBox.set(settings["source"])
+        self.sourceBox.grid(column=3,row=0)
         self.grab_set()
         try:
             if activePopup and activePopup.winfo_exists():
@@ -196,7 +612,9 @@ class GraphSettingsPopup(tk.Tk):
     def __saveButton(self):
         settings = {
             "fields": self.fs.getSelected(),
-            "limit": self.time.getLimit()
+            "limit": self.time.getLimit(),
+            "decimate": "selected" in self.decimate.state(),
+            "source": self.sourceBox.get()
         }
         self.graph.setSettings(settings)
         self.exitValue = "Save"
@@ -223,13 +641,22 @@ class GeneralSettingsPopup(tk.Tk):
         self.portlookup = {}
         for p in portlist:
             self.portlookup[str(p)] = p.device
-        tk.Label(serialFrame, text="Serial Port:", padx=10, pady=10).grid(column=0,row=0)
+        # Typing a new name adds a source
+        tk.Label(serialFrame, text="Source:", padx=10, pady=10).grid(column=0,row=0)
+        self.sourceBox = ttk.Combobox(serialFrame, values=list(sourceConfig.keys()))
+        self.sourceBox.bind("<<ComboboxSelected>>", self.__showSource)
+        self.sourceBox.grid(column=1,row=0,padx=10,pady=10)
+        tk.Label(serialFrame, text="Serial Port:", padx=10, pady=10).grid(column=0,row=1)
         self.portBox = ttk.Combobox(serialFrame, values=portlist)
-        self.portBox.set(port)
-        self.portBox.grid(column=1,row=0,padx=10,pady=10)
+        self.portBox.grid(column=1,row=1,padx=10,pady=10)
+        tk.Label(serialFrame, text="LoRa Address:", padx=10, pady=10).grid(column=0,row=2)
+        self.addressBox = ttk.Entry(serialFrame)
+        self.addressBox.grid(column=1,row=2,padx=10,pady=10)
+        self.sourceBox.set(next(iter(sourceConfig)))
+        self.__showSource()
 
         connectButton = ttk.Button(serialFrame, text="Connect",command=self.__connect)
-        connectButton.grid(column=1,row=1,sticky=(tk.W, tk.E))
+        connectButton.grid(column=1,row=3,sticky=(tk.W, tk.E))
 
         mapSettingFrame = tk.Frame(mf)
         mapSettingFrame.grid(column=0,row=1,sticky=(tk.W,tk.E,tk.N,tk.S))
@@ -241,39 +668,389 @@ class GeneralSettingsPopup(tk.Tk):
         self.mapRegionBox.set(region)
         self.mapRegionBox.grid(column=1,row=0)
 
-        ttk.Button(mf, text="Save", command=self.__save).grid(column=0,row=2,sticky=(tk.W, tk.E))
+        logSettingFrame = tk.Frame(mf)
+        logSettingFrame.grid(column=0,row=2,sticky=(tk.W,tk.E,tk.N,tk.S))
+        logSettingFrame["borderwidth"] = 2
+        logSettingFrame["relief"] = "raised"
 
-    def __connect(self):
-        global port
+        tk.Label(logSettingFrame, text="Raw Packets:", padx=10,pady=10).grid(column=0,row=0)
+        self.rawEchoBox = ttk.Combobox(logSettingFrame, state="readonly", values=rawEchoModes)
+        self.rawEchoBox.set(logConsole.rawEcho)
+        self.rawEchoBox.grid(column=1,row=0)
+
+        ttk.Button(mf, text="Save", command=self.__save).grid(column=0,row=3,sticky=(tk.W, tk.E))
+
+    def __showSource(self, event=None):
+        config = sourceConfig.get(self.sourceBox.get(), {})
+        address = config.get("address")
+        self.portBox.set(config.get("port") or "")
+        self.addressBox.delete(0, "end")
+        self.addressBox.insert(0, "" if address is None else str(address))
+
+    def __applySource(self):
+        name = self.sourceBox.get().strip()
+        if not name:
+            return False
         value = self.portBox.get()
-        port = self.portlookup.get(value) or value
-        startSerialThread()
+        address = self.addressBox.get().strip()
+        try:
+            address = int(address) if address else None
+        except ValueError:
+            log(f"Invalid LoRa address {address}", logLevels["ERROR"])
+            return False
+        config = dict(sourceConfig)
+        config[name] = {"port": self.portlookup.get(value) or value, "address": address}
+        return configureSources(config)
+
+    def __connect(self):
+        if self.__applySource():
+            startSerialThreads()
 
     def __save(self):
-        global port, region
-        value = self.portBox.get()
-        port = self.portlookup.get(value) or value
+        global region
+        if not self.__applySource():
+            return
         region = self.mapRegionBox.get()
+        logConsole.rawEcho = self.rawEchoBox.get()
         self.destroy()
         setRegion(region)
 
+class DiagnosticsPopup(tk.Tk):
+    """Stage latencies and per source packet counters, refreshed live
+    """
+    def __init__(self):
+        tk.Tk.__init__(self)
+        self.title("Diagnostics")
+        self.enabled = ttk.Checkbutton(self, text="Enabled", command=self.__toggle)
+        self.enabled.state(['!alternate', 'selected' if timings.enabled else '!selected'])
+        self.enabled.grid(column=0,row=0,padx=5,pady=5)
+        tk.Button(self, text="Reset", width=8, command=self.__reset).grid(column=1,row=0,padx=5)
+        tk.Button(self, text="Export", width=8, command=self.__export).grid(column=2,row=0,padx=5)
+        self.tableVar = tk.StringVar(self)
+        table = tk.Label(self, textvariable=self.tableVar, justify="left", anchor="w")
+        table.config(font=("Courier", 10))
+        table.grid(column=0,row=1,columnspan=3,padx=5,pady=5,sticky=(tk.W,tk.E))
+        self.lastCounts = {}
+        self.lastTime = time.monotonic()
+        self.__tick()
+
+    def __toggle(self):
+        timings.enabled = "selected" in self.enabled.state()
+
+    def __reset(self):
+        timings.reset()
+
+    def __export(self):
+        fn = filedialog.asksaveasfilename(filetypes=[("Diagnostics", "*.json")], defaultextension=".json")
+        if not fn:
+            return
+        try:
+            timings.export(fn, diagnosticsCounters())
+        except OSError as e:
+            log(f"Failed to export diagnostics: {e}", logLevels["ERROR"])
+
+    def __tick(self):
+        now = time.monotonic()
+        elapsed = max(now - self.lastTime, 1e-3)
+        counters = diagnosticsCounters()
+        lines = [f"{'stage':<10} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for stage, summary in timings.snapshot()["stages"].items():
+            lines.append(f"{stage:<10} {summary['count']:>8} {summary['p50Us'] / 1000:9.3f} {summary['p95Us'] / 1000:9.3f} "
+                         f"{summary['p99Us'] / 1000:9.3f} {summary['maxUs'] / 1000:9.3f}")
+        lines.append("")
+        lines.append(f"{'source':<10} {'pkt/s':>8} {'dropped':>9} {'late':>9} {'queued':>9}")
+        for name, c in counters["sources"].items():
+            rate = (c["received"] - self.lastCounts.get(name, c["received"])) / elapsed
+            self.lastCounts[name] = c["received"]
+            lines.append(f"{name:<10} {rate:8.1f} {c['dropped']:>9} {c['late']:>9} {c['depth']:>9}")
+        for port, c in counters["readers"].items():
+            lines.append(f"{port}: {c['unrouted']} lines for no source")
+        if counters["recorder"]:
+            lines.append(f"recorder: {counters['recorder']['recorded']} recorded, {counters['recorder']['dropped']} dropped"
+                         + (f", failed: {counters['recorder']['error']}" if counters['recorder']['error'] else ""))
+        if counters["publisher"]:
+            lines.append(f"publisher: {counters['publisher']['subscribers']} subscribers, "
+                         f"{counters['publisher']['dropped']} batches dropped")
+        for name, c in counters["exports"].items():
+            lines.append(f"live export {name}: {c['rows']} written, {c['dropped']} dropped")
+        if counters["tiles"]:
+            lines.append(f"map tiles: {counters['tiles']['stored']} of {counters['tiles']['tiles']} were cached, "
+                         f"{counters['tiles']['fetched']} fetched, {counters['tiles']['failed']} failed")
+        if not timings.enabled:
+            lines.append("Stage timing is off")
+        self.tableVar.set("\n".join(lines))
+        self.lastTime = now
+        self.after(displayRefreshDelay * 5, self.__tick)
+
+def decimateMinMax(times, values, buckets):
+    """Reduce a series to a min/max envelope of at most `buckets` equal-time buckets.
+
+    Each bucket contributes its min and max at the bucket's first timestamp, so short
+    spikes survive no matter how many samples fall into one pixel column.
+    """
+    if len(times) <= 2 * buckets:
+        return times, values
+    edges = np.linspace(times[0], times[-1], buckets, endpoint=False)
+    starts = np.unique(np.searchsorted(times, edges))
+    # fmin/fmax skip NaN, so a bucket is only a gap if every sample in it is missing
+    lows = np.fmin.reduceat(values, starts)
+    highs = np.fmax.reduceat(values, starts)
+    outTimes = np.repeat(times[starts], 2)
+    outValues = np.empty(len(outTimes))
+    outValues[0::2] = lows
+    outValues[1::2] = highs
+    return outTimes, outValues
+
+class GraphRenderer():
+    """Plots buffer fields onto a matplotlib figure.
+
+    Line artists persist between frames and are only updated with set_data. A full
+    canvas draw happens when the fields, window or y limits change; every other
+    frame restores a cached background and blits just the plot area.
+
+    The window is either a span of time before now or, with `laps` set, one of
+    lapWindowLabels, plotted from the start of that lap. With `source` set to an
+    analysis.AnalysisSource, the buffer is ignored and the source's view of a
+    recording is plotted instead. `title`, if set, names the car above the plot.
+    `clock`, if set, returns now on the buffer's sample clock, see TelemetrySource.now.
+    """
+    def __init__(self, figure, canvas, buffer, laps=None):
+        self.figure = figure
+        self.canvas = canvas
+        self.subplot = figure.add_subplot(111)
+        self.buffer = buffer
+        self.laps = laps
+        self.source = None
+        self.title = None
+        self.clock = None
+        self.fields = []
+        self.limit = None
+        self.decimate = True
+        self.lines = []
+        self.background = None
+        self.xlim = None
+        self.needsFullDraw = True
+        # Any full draw, including ones triggered by resizing the widget, refreshes the background
+        canvas.mpl_connect("draw_event", self._onDraw)
+
+    def invalidate(self):
+        self.needsFullDraw = True
+
+    def _onDraw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.subplot.bbox)
+
+    def _rebuild(self):
+        self.subplot.clear()
+        self.lines = []
+        for field in self.fields:
+            line, = self.subplot.plot([], [], label=field, animated=True)
+            self.lines.append(line)
+        if self.fields:
+            self.subplot.legend(loc="upper left")
+        if self.title and not self.source:
+            self.subplot.set_title(self.title)
+        self.subplot.set_xlim(self.xlim)
+        if self.source:
+            self.subplot.set_xlabel("Session time (s)")
+        elif self.limit in lapWindowLabels:
+            self.subplot.set_xlabel(f"{self.limit} (s)")
+        else:
+            self.subplot.set_xlabel(f"Last {self.limit} (s)")
+        self.subplot.set_ylim(0, 1)
+
+    def _lap(self):
+        if not self.laps:
+            return None
+        return self.laps.current() if self.limit == "This lap" else self.laps.last()
+
+    def _xLimits(self, lap, now):
+        if self.source:
+            start, end = self.source.view
+            return ((start - self.source.startTime) / 1000, (end - self.source.startTime) / 1000)
+        if self.limit not in lapWindowLabels:
+            return (-getWindowMS(self.limit) / 1000, 0)
+        if lap is None:
+            return (0, 60)
+        if lap.endTime is not None:
+            return (0, lap.elapsed(now) / 1000)
+        # Scale a lap in progress to the previous one, doubling whenever it runs longer
+        previous = self.laps.last()
+        span = previous.elapsed(now) if previous else 0
+        # An out lap can be zero length, which would never double
+        if span <= 0:
+            span = 60000
+        while span < lap.elapsed(now):
+            span *= 2
+        return (0, span / 1000)
+
+    def _fitLimits(self, lo, hi):
+        """New y limits for data spanning lo..hi, or the current ones if they still fit well
+        """
+        current = self.subplot.get_ylim()
+        if lo > hi:
+            return current
+        span = current[1] - current[0]
+        if current[0] <= lo and hi <= current[1] and (hi - lo) >= 0.5 * span:
+            return current
+        pad = (hi - lo) * 0.1 or abs(hi) * 0.1 or 1
+        return (lo - pad, hi + pad)
+
+    def draw(self):
+        now = self.clock() if self.clock else time.time() * 1000
+        lap = self._lap()
+        xlim = self._xLimits(lap, now)
+        if xlim != self.xlim:
+            self.xlim = xlim
+            self.needsFullDraw = True
+        full = self.needsFullDraw
+        if full:
+            self._rebuild()
+        if self.source:
+            since = None
+            origin = self.source.startTime
+        elif self.limit in lapWindowLabels:
+            since = None
+            origin = lap.startTime if lap else now
+        else:
+            since = now - getWindowMS(self.limit)
+            origin = now
+        # About two points per horizontal pixel
+        buckets = max(int(self.subplot.bbox.width), 1)
+        lo, hi = math.inf, -math.inf
+        for field, line in zip(self.fields, self.lines):
+            if self.source:
+                start, end = self.source.view
+                times, values = self.source.getView(field, start, end, buckets)
+                times, values = decimateMinMax(times, values, buckets)
+            elif since is None:
+                # A lap is short enough to decimate straight from raw samples
+                times, values = self.buffer.getRange(field, lap.startSeq, lap.endSeq) if lap else (np.empty(0), np.empty(0))
+                if self.decimate:
+                    times, values = decimateMinMax(times, values, buckets)
+            elif self.decimate:
+                # Long windows come from a summary tier with at least one bucket per two pixels
+                times, values = self.buffer.getEnvelope(field, since, now, buckets // 2)
+                times, values = decimateMinMax(times, values, buckets)
+            else:
+                times, values = self.buffer.getWindow(field, since)
+            # x axis is seconds relative to now, or into the lap
+            line.set_data((times - origin) / 1000, values)
+            if len(values) and not np.isnan(values).all():
+                lo = min(lo, np.nanmin(values))
+                hi = max(hi, np.nanmax(values))
+        ylim = self._fitLimits(lo, hi)
+        if full or ylim != self.subplot.get_ylim():
+            self.subplot.set_ylim(ylim)
+            self.needsFullDraw = False
+            self.canvas.draw()
+        if self.background is None:
+            return
+        self.canvas.restore_region(self.background)
+        for line in self.lines:
+            self.subplot.draw_artist(line)
+        self.canvas.blit(self.subplot.bbox)
+
+class ReplayPopup(tk.Tk):
+    def __init__(self, replay):
+        tk.Tk.__init__(self)
+        self.title("Replay")
+        self.replay = replay
+        self.start = replay.playback.startTime()
+        length = (replay.playback.endTime() - self.start) / 1000
+
+        self.pauseButton = tk.Button(self, text="Pause", width=8, command=self.__togglePause)
+        self.pauseButton.grid(column=0,row=0,padx=5,pady=5)
+
+        tk.Label(self, text="Speed:").grid(column=1,row=0)
+        self.speedBox = ttk.Combobox(self, state="readonly", values=list(replaySpeeds.keys()), width=5)
+        self.speedBox.set(next(k for k, v in replaySpeeds.items() if v == replay.speed))
+        self.speedBox.bind("<<ComboboxSelected>>", self.__setSpeed)
+        self.speedBox.grid(column=2,row=0,padx=5)
+
+        self.dragging = False
+        self.position = tk.Scale(self, from_=0, to=max(length, 1), orient="horizontal", length=400,
+                                 resolution=0.1, label="Position (s)")
+        self.position.grid(column=0,row=1,columnspan=3,padx=5,pady=5)
+        self.position.bind("<ButtonPress-1>", self.__startDrag)
+        self.position.bind("<ButtonRelease-1>", self.__seek)
+        self.__tick()
+
+    def __togglePause(self):
+        self.replay.paused = not self.replay.paused
+        self.pauseButton["text"] = "Resume" if self.replay.paused else "Pause"
+
+    def __setSpeed(self, event):
+        self.replay.speed = replaySpeeds[self.speedBox.get()]
+
+    def __startDrag(self, event):
+        self.dragging = True
+
+    def __seek(self, event):
+        self.dragging = False
+        self.replay.seek(self.start + self.position.get() * 1000)
+
+    def __tick(self):
+        if not self.replay.is_alive():
+            self.destroy()
+            return
+        if not self.dragging:
+            self.position.set((self.replay.position - self.start) / 1000)
+        self.after(displayRefreshDelay, self.__tick)
+
+class AnalysisPopup(tk.Tk):
+    """Pans and zooms the graphs over a recording opened for analysis, closing it returns them to live data
+    """
+    def __init__(self, source, graphs):
+        tk.Tk.__init__(self)
+        self.title("Analysis")
+        self.source = source
+        self.graphs = graphs
+        self.protocol("WM_DELETE_WINDOW", self.__close)
+        length = (source.endTime - source.startTime) / 1000
+
+        tk.Label(self, text="Window:").grid(column=0,row=0)
+        self.spanBox = ttk.Combobox(self, state="readonly", values=list(analysisSpans.keys()), width=5)
+        self.spanBox.set("All")
+        self.spanBox.bind("<<ComboboxSelected>>", self.__setView)
+        self.spanBox.grid(column=1,row=0,padx=5)
+        self.progressVar = tk.StringVar(self)
+        tk.Label(self, textvariable=self.progressVar).grid(column=2,row=0,padx=5)
+        tk.Button(self, text="Close", width=8, command=self.__close).grid(column=3,row=0,padx=5,pady=5)
+
+        self.position = tk.Scale(self, from_=0, to=max(length, 1), orient="horizontal", length=400,
+                                 resolution=0.1, label="Window start (s)", command=self.__setView)
+        self.position.grid(column=0,row=1,columnspan=4,padx=5,pady=5)
+        graphs.setSource(source)
+        self.__tick()
+
+    def __setView(self, event=None):
+        span = analysisSpans[self.spanBox.get()] or self.source.endTime - self.source.startTime
+        self.source.setView(self.source.startTime + self.position.get() * 1000, span)
+
+    def __close(self):
+        self.graphs.setSource(None)
+        self.source.close()
+        self.destroy()
+
+    def __tick(self):
+        progress = self.source.progress()
+        self.progressVar.set("Overview ready" if progress >= 1 else f"Overview {progress:.0%}")
+        self.after(displayRefreshDelay, self.__tick)
+
 class StatGraph(tk.Frame):
-    def __init__(self, parent, buffer):
+    def __init__(self, parent, telemetry):
         tk.Frame.__init__(self, parent)
         self["borderwidth"] = 2
         self["relief"] = "raised"
 
         f = Figure(layout="tight")
-        subplot = f.add_subplot(111)
-        self.subplot = subplot
-        self.buffer = buffer
-        self.fields = []
-        self.limit = None
         self.rowconfigure(0, weight=1)
         self.columnconfigure(0, weight=1)
 
         self.canvas = FigureCanvasTkAgg(f, self)
         self.canvas.get_tk_widget().grid(column=0,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
+        self.renderer = GraphRenderer(f, self.canvas, None)
+        self.setTelemetry(telemetry)
         
         lb = tk.Button(self, width=10, command=self.__settingsPopup, text="Settings")
         lb.grid(column=0,row=1)
@@ -284,33 +1061,50 @@ class StatGraph(tk.Frame):
         GraphSettingsPopup(self)
     
     def setFields(self, fs):
-        self.fields = fs
+        self.renderer.fields = fs
+        self.renderer.invalidate()
     
     def setBufferLimit(self, limit):
-        self.limit = limit
+        self.renderer.limit = limit
+        self.renderer.invalidate()
+
+    def setDecimate(self, decimate):
+        self.renderer.decimate = decimate
+
+    def setSource(self, source):
+        """Plot a recording opened for analysis, or the live buffer again if None
+        """
+        self.renderer.source = source
+        self.renderer.invalidate()
+
+    def setTelemetry(self, telemetry):
+        """Plot the live data of a TelemetrySource
+        """
+        self.telemetry = telemetry
+        self.renderer.buffer = telemetry.buffer
+        self.renderer.laps = telemetry.laps
+        self.renderer.clock = telemetry.now
+        self.renderer.title = telemetry.name if len(sources) > 1 else None
+        self.renderer.invalidate()
     
     def draw(self):
-        self.subplot.clear()
-        # self.subplot.axes.get_xaxis().set_visible(False)
-        limit = getPacketLimit(self.limit)
-        for _, v in enumerate(self.fields):
-            values = self.buffer.get(v, limit)
-            self.subplot.plot(values)
-        self.subplot.axes.set_xticks([])
-        self.subplot.legend(self.fields, loc="upper left")
-        self.subplot.set_xlabel(f"Last {self.limit}")
-        self.canvas.draw()
+        self.renderer.draw()
 
     def getSettings(self):
         return {
-            "fields": self.fields,
-            "limit": self.limit
+            "fields": self.renderer.fields,
+            "limit": self.renderer.limit,
+            "decimate": self.renderer.decimate,
+            "source": self.telemetry.name
         }
 
     def setSettings(self, settings):
-        if settings:
+        # Unchanged settings keep the renderer's cached background
+        if settings and settings != self.getSettings():
             self.setFields(settings["fields"])
             self.setBufferLimit(settings["limit"])
+            self.setDecimate(settings.get("decimate", True))
+            self.setTelemetry(findSource(settings.get("source")))
 
 class StatGraphContainer(tk.Frame):
     def __init__(self, parent):
@@ -320,6 +1114,7 @@ class StatGraphContainer(tk.Frame):
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
         self.graphs = []
+        self.source = None
         self.graphFrame = tk.Frame(self)
         self.graphFrame.grid(column=0,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
         self.graphFrame.rowconfigure(0, weight=1)
@@ -331,45 +1126,42 @@ class StatGraphContainer(tk.Frame):
         tk.Button(buttonFrame, text="Remove", command=self.removeGraph).grid(column=0,row=0)
         self.addGraph()
 
-    def __redoGraphs(self):
-        gBackup = self.graphs
-        self.graphs = []
-        for i, g in enumerate(gBackup):
-            settings = g.getSettings()
-            g.destroy()
-            graph = StatGraph(self.graphFrame, mainBuffer)
-            graph.grid(column=i,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
-            graph.setSettings(settings)
-            self.graphFrame.columnconfigure(i, weight=1)
-            self.graphs.append(graph)
-
     def __addGraph(self):
         idx = len(self.graphs)
-        graph = StatGraph(self.graphFrame, mainBuffer)
+        graph = StatGraph(self.graphFrame, findSource(None))
         graph.grid(column=idx,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
-        self.graphFrame.columnconfigure(idx, weight=1)
+        if self.source:
+            graph.setSource(self.source)
+        # A uniform group keeps every column the same width, so existing graphs only need a resize
+        self.graphFrame.columnconfigure(idx, weight=1, uniform="graphs")
         self.graphs.append(graph)
 
     def addGraph(self):
-        # This is so janky
-        # But if we only append a new graph it will be a different size than the rest of the graphs
-        # So instead remove all existing graphs, and recreate them.
-        self.__redoGraphs()
         self.__addGraph()
     
     def __removeGraph(self):
-        idx = len(self.graphs)
-        self.graphFrame.columnconfigure(idx, weight=0)
         graph = self.graphs.pop()
         graph.destroy()
+        self.graphFrame.columnconfigure(len(self.graphs), weight=0, uniform="")
 
     def removeGraph(self):
-        self.__removeGraph()
-        self.__redoGraphs()
+        if self.graphs:
+            self.__removeGraph()
     
     def draw(self):
         for _, graph in enumerate(self.graphs):
             graph.draw()
+
+    def setSource(self, source):
+        self.source = source
+        for graph in self.graphs:
+            graph.setSource(source)
+
+    def updateSources(self):
+        """Follow sources being added, changed or removed
+        """
+        for graph in self.graphs:
+            graph.setTelemetry(findSource(graph.telemetry.name))
     
     def getSettings(self):
         settings = []
@@ -378,21 +1170,53 @@ class StatGraphContainer(tk.Frame):
         return settings
     
     def __setGraphCount(self, count):
-        current = len(self.graphs)
-        while current > count:
+        while len(self.graphs) > count:
             self.__removeGraph()
-            current -= 1
-        while current < count:
+        while len(self.graphs) < count:
             self.__addGraph()
-            current += 1
-        self.__redoGraphs()
 
     def setSettings(self, settings):
+        """Apply a layout, reusing the graphs already shown and only changing the ones whose settings differ
+        """
         graphCount = len(settings)
         self.__setGraphCount(graphCount)
         for i, set in enumerate(settings):
             self.graphs[i].setSettings(set)
 
+class StatOverviewRenderer():
+    """Writes one field's latest value and MIN/AVG/MAX into four Tk variables.
+
+    Nothing is formatted unless the field's version in the buffer or the stats
+    source changed since the last draw, and a variable is only set when its
+    text changed, so idle tiles cost a couple of lookups per frame.
+    """
+    def __init__(self, buffer, key, valueVar, minVar, avgVar, maxVar):
+        self.buffer = buffer
+        self.key = key
+        self.vars = (valueVar, minVar, avgVar, maxVar)
+        self.texts = [None] * 4
+        self.drawn = None
+
+    def draw(self, stats=None):
+        """Show MIN/AVG/MAX from `stats` (a Lap), or from the buffer if None. Returns whether anything was redrawn
+        """
+        stats = stats or self.buffer
+        key = self.key
+        state = (self.buffer, stats, self.buffer.version(key), stats.version(key))
+        if state == self.drawn:
+            return False
+        self.drawn = state
+        fstr = '{:9.2f}'
+        texts = ('{:9.2f}{:s}'.format(self.buffer.getLast(key) or 0, fieldUnits.get(key) or ""),
+                 fstr.format(stats.getMin(key) or 0),
+                 '({:9.2f})'.format(stats.getAvg(key) or 0),
+                 fstr.format(stats.getMax(key) or 0))
+        for i, text in enumerate(texts):
+            if text != self.texts[i]:
+                self.texts[i] = text
+                self.vars[i].set(text)
+        return True
+
 class StatOverview(tk.Frame):
     def __init__(self, parent, buffer, key):
         tk.Frame.__init__(self, parent)
@@ -401,7 +1225,6 @@ class StatOverview(tk.Frame):
         self["pady"] = 5
         self["padx"] = 5
 
-        self.buffer = buffer
         self.key = key
 
         label = tk.Label(self, text=key)
@@ -427,44 +1250,195 @@ class StatOverview(tk.Frame):
         maxLabel = tk.Label(self, textvariable=self.maxVar)
         maxLabel.grid(column=2,row=2)
         tk.Label(self, text="MAX").grid(column=2,row=3)
+        self.renderer = StatOverviewRenderer(buffer, key, self.valueVar, self.minVar, self.avgVar, self.maxVar)
+
+    def setBuffer(self, buffer):
+        self.renderer.buffer = buffer
     
-    def draw(self):
-        fstr = '{:9.2f}'
-        self.valueVar.set('{:9.2f}{:s}'.format(self.buffer.getLast(self.key) or 0, fieldUnits.get(self.key) or ""))
-        self.minVar.set(fstr.format(self.buffer.getMin(self.key) or 0))
-        self.avgVar.set('({:9.2f})'.format(self.buffer.getAvg(self.key) or 0))
-        self.maxVar.set(fstr.format(self.buffer.getMax(self.key) or 0))
+    def draw(self, stats=None):
+        """Show the latest value, with MIN/AVG/MAX taken from `stats` (a Lap), or from the buffer if None
+        """
+        self.renderer.draw(stats)
+
+def formatLapTime(ms):
+    if ms is None:
+        return "--:--.-"
+    return f"{int(ms // 60000)}:{ms % 60000 / 1000:04.1f}"
 
 class StatOverviewContainer(tk.Frame):
-    def __init__(self, parent, buffer):
+    def __init__(self, parent, telemetry):
         tk.Frame.__init__(self, parent)
         self.statViews = []
         self.rowconfigure(0,weight=1)
-        for i, field in enumerate(expectedFields):
-            gs = StatOverview(self, buffer, field)
+
+        self.lapFrame = tk.Frame(self)
+        self.sourceBox = ttk.Combobox(self.lapFrame, state="readonly", values=list(sources.keys()), width=10)
+        self.sourceBox.bind("<<ComboboxSelected>>", lambda event: self.setTelemetry(findSource(self.sourceBox.get())))
+        self.sourceBox.grid(column=0,row=0)
+        self.windowBox = ttk.Combobox(self.lapFrame, state="readonly", values=statWindows, width=10)
+        self.windowBox.set(statWindows[0])
+        self.windowBox.grid(column=1,row=0)
+        self.lapVar = tk.StringVar()
+        self.lapText = None
+        tk.Label(self.lapFrame, textvariable=self.lapVar, padx=10).grid(column=2,row=0)
+        self.setTelemetry(telemetry)
+        self.setFields(displayFields())
+
+    def setTelemetry(self, telemetry):
+        """Show the live data of a TelemetrySource
+        """
+        self.telemetry = telemetry
+        self.buffer = telemetry.buffer
+        self.laps = telemetry.laps
+        self.sourceBox.set(telemetry.name)
+        for statView in self.statViews:
+            statView.setBuffer(telemetry.buffer)
+
+    def updateSources(self):
+        """Follow sources being added, changed or removed
+        """
+        self.sourceBox["values"] = list(sources.keys())
+        self.setTelemetry(findSource(self.telemetry.name))
+
+    def setFields(self, fields):
+        for statView in self.statViews:
+            statView.destroy()
+        self.statViews = []
+        for i, field in enumerate(fields):
+            gs = StatOverview(self, self.buffer, field)
             gs.grid(column=math.floor(i/2),row=i%2,sticky=(tk.N,tk.E,tk.W,tk.S))
             self.statViews.append(gs)
-        
+        self.lapFrame.grid(column=0,row=2,columnspan=math.ceil(len(fields)/2),sticky=(tk.W,tk.E))
+
+    def _stats(self):
+        window = self.windowBox.get()
+        if not self.laps or window == "Buffer":
+            return None
+        if window == "This lap":
+            return self.laps.current()
+        if window == "Last lap":
+            return self.laps.last()
+        return self.laps.best()
+
     def draw(self):
+        stats = self._stats()
         for _, statView in enumerate(self.statViews):
-            statView.draw()
+            statView.draw(stats)
+        if self.laps:
+            current = self.laps.current()
+            last = self.laps.last()
+            best = self.laps.best()
+            text = "Lap {}  {}   Last {}   Best {}".format(
+                current.number if current else 0,
+                formatLapTime(current.elapsed(self.telemetry.now()) if current and current.timed else None),
+                formatLapTime(last.lapTime() if last else None),
+                formatLapTime(best.lapTime() if best else None))
+            if text != self.lapText:
+                self.lapText = text
+                self.lapVar.set(text)
 
 def parsePacket(pkt):
     if pkt[0:5] != "TELEM":
         return None
-    matches = re.findall("([a-zA-Z]+)=(-?[0-9]+\\.?[0-9]*)[;\n]", pkt)
+    matches = re.findall("([a-zA-Z]+)=(-?[0-9]+\\.?[0-9]*)(?:[;\r\n]|$)", pkt)
     values = {}
     for match in matches:
         values[match[0]] = float(match[1])
     return values
 
+def rcvPayloadSpan(buf, start=0):
+    """(begin, end) offsets of the payload in a +RCV=<addr>,<len>,<payload>,<rssi>,<snr> line, None if the header is unusable
+    """
+    addrEnd = buf.find(b",", start + 5)
+    if addrEnd == -1:
+        return None
+    lenEnd = buf.find(b",", addrEnd + 1)
+    if lenEnd == -1:
+        return None
+    try:
+        length = int(buf[addrEnd + 1:lenEnd])
+    except ValueError:
+        return None
+    if not 0 <= length <= maxLoraPayload:
+        return None
+    return lenEnd + 1, lenEnd + 1 + length
+
+def rcvAddress(line):
+    """Sender address of a +RCV= line (bytes), None if it is not one
+    """
+    if not line.startswith(b"+RCV="):
+        return None
+    try:
+        return int(line[5:line.find(b",", 5)])
+    except ValueError:
+        return None
+
+def parseLoraFrame(line):
+    """Decode the payload of a +RCV= line (bytes) if it is a binary telemetry frame, else None
+    """
+    span = rcvPayloadSpan(line)
+    if span is None:
+        return None
+    payload = line[span[0]:span[1]]
+    if not telemframe.isFrame(payload):
+        return None
+    decoded = telemframe.decodeFrame(payload)
+    # A corrupt frame is still a frame, don't fall back to text parsing
+    return decoded[1] if decoded else {}
+
 def parseLoraPacket(pkt):
-    if pkt[0:5] != "+RCV=":
+    """Parse a +RCV= line (str or bytes) carrying a TELEM text packet or a binary frame into a dict
+    """
+    if isinstance(pkt, str):
+        pkt = pkt.encode()
+    if pkt[0:5] != b"+RCV=":
         return None
-    idx = pkt.find("TELEM")
+    values = parseLoraFrame(pkt)
+    if values is not None:
+        return values or None
+    span = rcvPayloadSpan(pkt)
+    if span is None:
+        return None
+    idx = pkt.find(b"TELEM", span[0], span[1])
     if idx == -1:
         return None
-    return parsePacket(pkt[idx:])
+    # Only the payload, the ,rssi,snr after it would otherwise hide the last field
+    return parsePacket(pkt[idx:span[1]].decode())
+
+# A value ends at a separator or at the end of the payload
+fieldPattern = re.compile(rb"([a-zA-Z]+)=(-?[0-9]+\.?[0-9]*)(?:[;\r\n]|$)")
+
+def parsePacketRow(pkt, schema, start=0, end=None):
+    """Parse a raw TELEM payload (bytes) between `start` and `end` straight into a schema-indexed row
+    """
+    if not pkt.startswith(b"TELEM", start):
+        return None
+    byteIndex = schema.byteIndex
+    row = [math.nan] * len(schema)
+    for name, value in fieldPattern.findall(pkt, start, len(pkt) if end is None else end):
+        idx = byteIndex.get(name)
+        if idx is None:
+            idx = schema.indexOf(name.decode())
+        if idx >= len(row):
+            row.extend([math.nan] * (idx + 1 - len(row)))
+        row[idx] = float(value)
+    return row
+
+def parseLoraRow(line, schema):
+    """Bytes equivalent of parseLoraPacket, returning a schema-indexed row
+    """
+    if not line.startswith(b"+RCV="):
+        return None
+    values = parseLoraFrame(line)
+    if values is not None:
+        return schema.toRow(values) if values else None
+    span = rcvPayloadSpan(line)
+    if span is None:
+        return None
+    idx = line.find(b"TELEM", span[0], span[1])
+    if idx == -1:
+        return None
+    return parsePacketRow(line, schema, idx, span[1])
 
 
 # i = 0
@@ -496,20 +1470,30 @@ def parseLoraPacket(pkt):
 #     return data
 
 fileTypes = [("Layout config", "*.config")]
+replayFileTypes = [("Session recording", "*.rec"), ("TELEM text capture", "*.txt")]
+analysisFileTypes = [("Session recording", "*.rec")]
+exportFileTypes = [(f"{name.upper()} file", f"*.{name}") for name in export.formats()]
 
 running = True
 class AsyncSerial(Thread):
-    def __init__(self):
+    """Reads one serial port and routes every line to the source it belongs to, see routeLine
+    """
+    def __init__(self, port):
         super().__init__()
-        self.lastPktTime = time.time()
+        self.port = port
+        self.stopped = False
+        self.unrouted = 0
+        self.unknownAddresses = set()
 
-    def open(self, port):
+    def open(self):
         try:
-            self.s = serial.Serial(port, baudrate=baudrate, timeout=1)
-            self.lastPktTime = time.time()
+            self.s = serial.Serial(self.port, baudrate=baudrate, timeout=1)
             return True
         except serial.serialutil.SerialException:
             return False
+
+    def stop(self):
+        self.stopped = True
     
     def initLora(self):
         log("Resetting Modem")
@@ -532,56 +1516,719 @@ class AsyncSerial(Thread):
         log(data)
     
     def run(self):
-        while running:
-            data = self.s.readline()
-            log(data)
-            try:
-                pkt = parseLoraPacket(data.decode())
-                if pkt:
-                    delta = (time.time() - self.lastPktTime) * 1000 # second to ms
-                    if delta < 3*expectedPacketDelay:
-                        # filter outliers
-                        pkt['delta'] = delta
-                    if pkt.get("LAT"):
-                        logPosition(pkt.get("LAT"), pkt.get("LON"))
-                    if pkt.get("ACCZ") and pkt.get("ACCX"):
-                        z = pkt.get("ACCZ")
-                        x = pkt.get("ACCX")
-                        pkt["Slope"] = -math.degrees(math.atan2(z, -x))
-                    mainBuffer.add(pkt)
-                    statContainer.draw()
-            except UnicodeDecodeError as e:
-                pass
-            self.lastPktTime = time.time()
-
-def log(s):
-    logInfo.insert("end", f"[{time.strftime('%I:%M:%S')}]: {s}\n")
-    logInfo.see("end")
-
-def startSerialThread():
-    global serialThread
-    if serialThread:
-        log("Serial thread already running!")
+        # Only read and parse here, all Tk and buffer work happens in ingestTick on the main thread
+        self.s.timeout = serialReadTimeout
+        framer = LineFramer()
+        discarded = 0
+        while running and not self.stopped:
+            # Take everything the OS has buffered, or block briefly for the next byte
+            chunk = self.s.read(self.s.in_waiting or 1)
+            if not chunk:
+                continue
+            rxTime = time.time() * 1000
+            rxMono = time.monotonic()
+            lines = framer.feed(chunk)
+            if framer.discarded != discarded:
+                log(f"{self.port}: dropped {framer.discarded - discarded} bytes without a line ending", logLevels["WARN"])
+                discarded = framer.discarded
+            for data in lines:
+                if recorder:
+                    recorder.record(rxTime, data)
+                source = routeLine(data, self.port)
+                if source is None:
+                    self._unrouted(data)
+                    continue
+                if timings.enabled:
+                    started = time.perf_counter_ns()
+                    row = parseLoraRow(data, mainSchema)
+                    timings.record("parse", (time.perf_counter_ns() - started) / 1000)
+                else:
+                    row = parseLoraRow(data, mainSchema)
+                source.queue.push((rxTime, data, row, rxMono))
+        self.s.close()
+
+    def _unrouted(self, data):
+        self.unrouted += 1
+        address = rcvAddress(data)
+        if address is not None and address not in self.unknownAddresses:
+            self.unknownAddresses.add(address)
+            log(f"{self.port}: no source for LoRa address {address}", logLevels["WARN"])
+
+class NetworkReader(fanout.Subscriber):
+    """Feeds the sources of a tcp:// port from another instance's publisher, in place of a serial reader.
+
+    Rows are remapped from the publisher's columns to ours by field name. Each
+    batch is stamped with local receive times, keeping the spacing of its
+    samples, so clocks of the two laptops need not agree.
+    """
+    def __init__(self, port):
+        host, tcpPort = fanout.parseAddress(port)
+        super().__init__(host, tcpPort, self._batch)
+        self.port = port
+        self.unrouted = 0
+        # Our column of each field, per distinct published field list
+        self.columns = {}
+
+    def open(self):
+        return True
+
+    def initLora(self):
+        pass
+
+    def _source(self, name):
+        candidates = [source for source in list(sources.values()) if source.port == self.port]
+        for source in candidates:
+            if source.name == name:
+                return source
+        return next((source for source in candidates if source.address is None), None)
+
+    def _batch(self, name, fields, times, rows):
+        source = self._source(name)
+        if source is None:
+            self.unrouted += len(rows)
+            return
+        key = tuple(fields)
+        columns = self.columns.get(key)
+        if columns is None:
+            columns = self.columns[key] = [mainSchema.indexOf(field) for field in fields]
+        offset = time.time() * 1000 - times[-1] if times else 0
+        rxMono = time.monotonic()
+        for t, values in zip(times, rows):
+            row = [math.nan] * len(mainSchema)
+            for idx, value in zip(columns, values):
+                if idx >= len(row):
+                    row.extend([math.nan] * (idx + 1 - len(row)))
+                row[idx] = value
+            source.queue.push((t + offset, None, row, rxMono))
+
+class LineFramer():
+    """Splits a byte stream into complete newline terminated lines, keeping partial lines for the next chunk.
+
+    A partial line is only searched for a newline once, and once it passes
+    `maxLength` bytes it is dropped, counted in `discarded`, and framing picks
+    up again after the next newline.
+    """
+    def __init__(self, maxLength=maxLineBytes):
+        self.pending = bytearray()
+        self.maxLength = maxLength
+        # Offset in pending up to which the partial line has no newline
+        self.searched = 0
+        self.discarded = 0
+        self.skipping = False
+
+    def feed(self, chunk):
+        pending = self.pending
+        pending += chunk
+        lines = []
+        start = 0
+        if self.skipping:
+            end = pending.find(b"\n")
+            if end == -1:
+                self.discarded += len(pending)
+                pending.clear()
+                return lines
+            self.discarded += end + 1
+            start = end + 1
+            self.skipping = False
+        while True:
+            searchFrom = max(start, self.searched)
+            if pending.startswith(b"+RCV=", start):
+                # Skip over the payload using its length, binary frames can contain newlines
+                span = rcvPayloadSpan(pending, start)
+                if span:
+                    if span[1] > len(pending):
+                        break
+                    searchFrom = max(searchFrom, span[1])
+            end = pending.find(b"\n", searchFrom)
+            if end == -1:
+                self.searched = len(pending)
+                break
+            lines.append(bytes(pending[start:end + 1]))
+            start = end + 1
+            self.searched = 0
+        if len(pending) - start > self.maxLength:
+            self.discarded += len(pending) - start
+            start = len(pending)
+            self.searched = 0
+            self.skipping = True
+        if start:
+            del pending[:start]
+            self.searched = max(self.searched - start, 0)
+        return lines
+
+class IngestQueue():
+    """Bounded hand-off from reader threads to the Tk main loop.
+
+    Items are (sample time in ms since the epoch, raw line or None, schema row
+    or None, time.monotonic() when received). Stage timings use the monotonic
+    time, so a wall clock step never shows up as latency.
+
+    push() never blocks; when the queue is full the packet is dropped and counted.
+    Sources that can be slowed down, like replays, use pushWait() instead.
+    """
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        self.received = 0
+        self.dropped = 0
+
+    def push(self, item):
+        self.received += 1
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def pushWait(self, item, timeout):
+        """Queue an item, waiting up to `timeout` seconds for room. Returns False if it timed out
+        """
+        try:
+            self.queue.put(item, timeout=timeout)
+        except queue.Full:
+            return False
+        self.received += 1
+        return True
+
+    def drain(self):
+        items = []
+        try:
+            while True:
+                items.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def depth(self):
+        return self.queue.qsize()
+
+class TelemetrySource():
+    """Everything kept about one car: its ingest queue, buffer, laps, derived channel state and GPS track.
+
+    Readers only ever push to a source's own queue, so a source that floods it
+    drops its own packets and nobody else's. The rest is only touched from the
+    Tk main loop.
+    """
+    def __init__(self, name, port, address, schema, color=None):
+        self.name = name
+        self.port = port
+        self.address = address
+        self.color = color or sourceColors[0]
+        self.queue = IngestQueue(ingestQueueSize)
+        self.buffer = RollingBuffer(maxBufferLength, schema)
+        self.laps = laps.LapIndex(schema, lapGates.get(region), minLapMs)
+        self.derived = derived.DerivedChannels(schema, derivedChannels)
+        self.track = track.TrackLog()
+        self.trackLayer = None
+        # Sample clock minus wall clock in ms, only non-zero while a sped up replay feeds this source
+        self.clockOffset = 0.0
+        # time.monotonic() when the newest sample in the buffer was received
+        self.lastReceived = None
+
+    def now(self):
+        """Current time on the clock this source's samples are stamped with, in ms
+        """
+        return time.time() * 1000 + self.clockOffset
+
+    def showOn(self, mapWidget):
+        self.trackLayer = track.TrackLayer(mapWidget, self.track, trackChunkSize, trackTolerance, trackMaxPoints, self.color)
+
+    def apply(self, rxTime, row):
+        position = None
+        lat = mainSchema.get(row, "LAT")
+        lon = mainSchema.get(row, "LON")
+        if lat and lon is not None:
+            position = logPosition(self.track, lat, lon, rxTime)
+        self.derived.apply(row, rxTime)
+        seq = self.buffer.head
+        self.buffer.addRow(row, rxTime)
+        self.laps.add(seq, rxTime, row, position)
+
+def routeLine(line, port=None):
+    """The source a line received on `port` belongs to, or None.
+
+    A source configured with an address takes the +RCV= lines from that
+    address, one without takes every other line on its port. Replays have no
+    port and go by address alone, lines without one go to the first source.
+    """
+    address = rcvAddress(line)
+    match = None
+    for source in list(sources.values()):
+        if port is not None and source.port != port:
+            continue
+        if source.address is not None and source.address == address:
+            return source
+        if source.address is None and match is None:
+            match = source
+    if match is None and port is None and address is None:
+        match = findSource(None)
+    return match
+
+def findSource(name):
+    """The source called `name`, or the first one if there is none by that name
+    """
+    return sources.get(name) or next(iter(sources.values()), None)
+
+class ReplaySource(Thread):
+    """Feeds a recorded session or a TELEM text capture through the same ingest path as AsyncSerial.
+
+    Lines are paced by their recorded receive times divided by `speed`, or pushed as
+    fast as the UI drains them when speed is None. Samples keep their recorded
+    receive times, shifted so playback starts at the current time, so lap times
+    and deriv() see the real intervals at any speed. Each source's clockOffset
+    follows the replay, so graph windows and lap timers move on its clock.
+    """
+    def __init__(self, path, speed=1):
+        super().__init__(daemon=True)
+        self.playback = session.SessionPlayback(path, expectedPacketDelay)
+        self.speed = speed
+        self.paused = False
+        self.stopped = False
+        self.seekTo = None
+        self.anchor = None
+        self.position = self.playback.startTime()
+        # Added to recorded times, set again after every seek so stamps never go backwards
+        self.shift = None
+        self.lastStamp = -math.inf
+
+    def stop(self):
+        self.stopped = True
+
+    def seek(self, t):
+        self.seekTo = t
+
+    def _interrupted(self):
+        return not running or self.stopped or self.seekTo is not None
+
+    def _wait(self, rxTime):
+        """Sleep until rxTime is due at the current speed. Returns False if stopped or seeking meanwhile
+        """
+        while not self._interrupted():
+            speed = self.speed
+            if self.paused or (self.anchor and self.anchor[2] != speed):
+                # Restart pacing from wherever playback resumes
+                self.anchor = None
+            if self.paused:
+                time.sleep(0.05)
+                continue
+            if not speed:
+                return True
+            if self.anchor is None:
+                self.anchor = (rxTime, time.monotonic(), speed)
+            start, wallStart, _ = self.anchor
+            delay = wallStart + (rxTime - start) / 1000 / speed - time.monotonic()
+            if delay <= 0:
+                return True
+            time.sleep(min(delay, 0.1))
+        return False
+
+    def _push(self, rxTime, line):
+        source = routeLine(line)
+        if source is None:
+            return
+        if line.startswith(b"+RCV="):
+            row = parseLoraRow(line, mainSchema)
+        else:
+            row = parsePacketRow(line, mainSchema)
+        now = time.time() * 1000
+        if self.shift is None:
+            self.shift = max(now, self.lastStamp) - rxTime
+        t = self.lastStamp = rxTime + self.shift
+        source.clockOffset = t - now
+        item = (t, line, row, time.monotonic())
+        while not source.queue.pushWait(item, 0.1):
+            if not running or self.stopped:
+                return
+
+    def run(self):
+        since = None
+        while True:
+            self.seekTo = None
+            self.anchor = None
+            self.shift = None
+            for rxTime, line in self.playback.records(since):
+                if not self._wait(rxTime):
+                    break
+                self.position = rxTime
+                self._push(rxTime, line)
+            if self.seekTo is None or not running or self.stopped:
+                break
+            since = self.seekTo
+        self.playback.close()
+
+def ingestTick():
+    """Apply everything the readers queued since the last tick, then refresh the map once
+    """
+    received = False
+    timed = timings.enabled
+    for source in list(sources.values()):
+        items = source.queue.drain()
+        if timed and items:
+            now = time.monotonic()
+            for _, _, _, rxMono in items:
+                timings.record("queue", (now - rxMono) * 1e6)
+                if (now - rxMono) * 1000 > diagnosticsLateMs:
+                    timings.countLate(source.name)
+        times = []
+        rows = []
+        for rxTime, data, row, rxMono in items:
+            # Network sources have no raw line
+            if data:
+                log(data, logLevels["RAW"])
+            if row:
+                if timed:
+                    started = time.perf_counter_ns()
+                    source.apply(rxTime, row)
+                    timings.record("apply", (time.perf_counter_ns() - started) / 1000)
+                else:
+                    source.apply(rxTime, row)
+                times.append(rxTime)
+                rows.append(row)
+                source.lastReceived = rxMono
+        if publisher and rows:
+            publisher.publish(source.name, mainSchema.names, times, rows)
+        if liveExport and rows:
+            exportLive(source, times, rows)
+        received = received or bool(items)
+    if received:
+        drawPosition()
+
+def setDerivedChannels(channels):
+    """Compile and switch to a new set of derived channels, keeping the current ones if any fails to compile
+    """
+    global derivedChannels
+    try:
+        derived.DerivedChannels(mainSchema, channels)
+    except ValueError as e:
+        log(str(e), logLevels["ERROR"])
+        return False
+    derivedChannels = dict(channels)
+    # Windowed functions keep state, so every source gets its own engine
+    for source in sources.values():
+        source.derived = derived.DerivedChannels(mainSchema, channels)
+    if statContainer:
+        statContainer.setFields(displayFields())
+    return True
+
+def configureSources(config):
+    """Add, update and remove sources to match a sourceConfig style dict, stopping readers no source uses any more
+    """
+    global sourceConfig
+    if not config:
+        log("At least one source is needed", logLevels["ERROR"])
+        return False
+    sourceConfig = {name: {"port": c.get("port"), "address": c.get("address")} for name, c in config.items()}
+    for name in list(sources):
+        if name not in sourceConfig:
+            removed = sources.pop(name)
+            if removed.trackLayer:
+                removed.trackLayer.delete()
+    for n, (name, c) in enumerate(sourceConfig.items()):
+        source = sources.get(name)
+        if source is None:
+            source = sources[name] = TelemetrySource(name, c["port"], c["address"], mainSchema,
+                                                     sourceColors[n % len(sourceColors)])
+            if mapWidget:
+                source.showOn(mapWidget)
+        source.port = c["port"]
+        source.address = c["address"]
+    ports = set(c["port"] for c in sourceConfig.values())
+    for p in list(serialThreads):
+        if p not in ports:
+            stopSerialThread(p)
+    if statContainer:
+        statContainer.updateSources()
+    if graphContainer:
+        graphContainer.updateSources()
+    return True
+
+def analysisParser():
+    """Line parser for analysis.AnalysisSource, with derived channels of its own
+    """
+    engine = derived.DerivedChannels(mainSchema, derivedChannels)
+    def parse(rxTime, line):
+        if line.startswith(b"+RCV="):
+            row = parseLoraRow(line, mainSchema)
+        else:
+            row = parsePacketRow(line, mainSchema)
+        return engine.apply(row, rxTime) if row else None
+    return parse
+
+def openAnalysis(path):
+    start = time.perf_counter()
+    try:
+        source = analysis.AnalysisSource(path, mainSchema, analysisParser)
+    except (OSError, ValueError) as e:
+        log(f"Failed to open {path} for analysis: {e}", logLevels["ERROR"])
+        return None
+    log(f"Opened {path} for analysis in {(time.perf_counter() - start) * 1000:.0f} ms, "
+        f"{len(source.blockTimes)} blocks, {(source.endTime - source.startTime) / 60000:.1f} min")
+    return source
+
+def startReplay(path, speed=1):
+    global replayThread
+    stopReplay()
+    try:
+        replayThread = ReplaySource(path, speed)
+    except (OSError, ValueError) as e:
+        log(f"Failed to open replay: {e}", logLevels["ERROR"])
+        return None
+    log(f"Replaying {path}")
+    replayThread.start()
+    return replayThread
+
+def stopReplay():
+    global replayThread
+    if replayThread:
+        replayThread.stop()
+        replayThread.join()
+        replayThread = None
+
+class LogConsole():
+    """Bounded log shown in a Tk Text widget.
+
+    Entries can come from any thread. The last `maxLines` of them wait in a ring
+    until flush() writes them to the widget in one batch and trims it to
+    `maxLines`, so a flood before the widget exists, or between flushes, only
+    keeps what would be shown anyway. Raw packet echo can be switched off or
+    sampled, and everything that passes the filter can be mirrored to a
+    rotating log file.
+    """
+    def __init__(self, maxLines):
+        self.pending = deque(maxlen=maxLines)
+        self.maxLines = maxLines
+        self.widget = None
+        self.rawEcho = "sampled"
+        self.rawCount = 0
+        self.fileLogger = None
+
+    def setFile(self, path):
+        if self.fileLogger:
+            for handler in self.fileLogger.handlers:
+                handler.close()
+            self.fileLogger.handlers.clear()
+            self.fileLogger = None
+        if path:
+            self.fileLogger = logging.getLogger("field-side")
+            self.fileLogger.propagate = False
+            self.fileLogger.setLevel(logLevels["RAW"])
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=logFileBytes, backupCount=logFileBackups)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            self.fileLogger.addHandler(handler)
+
+    def write(self, s, level):
+        if level == logLevels["RAW"]:
+            if self.rawEcho == "off":
+                return
+            self.rawCount += 1
+            if self.rawEcho == "sampled" and self.rawCount % rawEchoSampleEvery != 1:
+                return
+        entry = f"[{time.strftime('%I:%M:%S')}]: {s}"
+        self.pending.append(entry)
+        if self.fileLogger:
+            self.fileLogger.log(level, "%s", s)
+
+    def flush(self):
+        if not self.widget or not self.pending:
+            return
+        entries = []
+        try:
+            while True:
+                entries.append(self.pending.popleft())
+        except IndexError:
+            pass
+        text = "\n".join(entries) + "\n"
+        self.widget.insert("end", text)
+        self.widget.delete("1.0", f"end-{self.maxLines + 1}l")
+        self.widget.see("end")
+
+logConsole = LogConsole(logMaxLines)
+
+def log(s, level=logLevels["INFO"]):
+    logConsole.write(s, level)
+
+def startSerialThread(port):
+    if port in serialThreads:
+        log(f"Serial thread for {port} already running!", logLevels["WARN"])
         return
-    serialThread = AsyncSerial()
+    try:
+        reader = NetworkReader(port) if port.startswith(fanout.scheme) else AsyncSerial(port)
+    except ValueError as e:
+        log(str(e), logLevels["ERROR"])
+        return False
     log(port)
-    if not serialThread.open(port):
-        log("Failed to open serial port!")
-        serialThread = None
+    if not reader.open():
+        log(f"Failed to open serial port {port}!", logLevels["ERROR"])
+        return False
+    reader.initLora()
+    # A network source has no raw lines to record, the publishing instance records them
+    if isinstance(reader, AsyncSerial):
+        startRecorder()
+    serialThreads[port] = reader
+    reader.start()
+    return True
+
+def startSerialThreads():
+    """Start a reader for every port in sourceConfig that does not have one yet
+    """
+    for p in dict.fromkeys(c["port"] for c in sourceConfig.values()):
+        if p and p not in serialThreads:
+            startSerialThread(p)
+
+def stopSerialThread(port):
+    reader = serialThreads.pop(port, None)
+    if reader:
+        reader.stop()
+        reader.join()
+
+def startPublisher(port):
+    """Publish ingested samples on `port`, replacing any publisher already running. None just stops it
+    """
+    global publisher, publishPort
+    if publisher:
+        publisher.close()
+        publisher = None
+    publishPort = port
+    if port is None:
+        return True
+    try:
+        publisher = fanout.Publisher(publishHost, port, publishQueueSize)
+    except OSError as e:
+        log(f"Failed to publish on port {port}: {e}", logLevels["ERROR"])
         return False
-    serialThread.initLora()
-    serialThread.start()
+    publisher.start()
+    log(f"Publishing telemetry on {publishHost}:{publisher.port}")
     return True
 
+def exportLive(source, times, rows):
+    """Hand a tick's rows to the source's LiveExport, starting one the first time
+    """
+    exporter = liveExports.get(source.name)
+    if exporter is None:
+        os.makedirs(exportDirectory, exist_ok=True)
+        path = os.path.join(exportDirectory, f"{source.name}-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+        try:
+            exporter = liveExports[source.name] = export.LiveExport(
+                path, mainSchema.names,
+                onError=lambda e: log(f"Live export to {path} failed, nothing more is written: {e}", logLevels["WARN"]))
+        except (OSError, ValueError) as e:
+            log(f"Failed to start live export: {e}", logLevels["ERROR"])
+            setLiveExport(False)
+            return
+        exporter.start()
+        log(f"Exporting {source.name} to {path}")
+    exporter.add(times, rows)
+
+def setLiveExport(enabled):
+    """Switch live export on or off, closing the files of a previous run
+    """
+    global liveExport
+    liveExport = enabled
+    if enabled:
+        return
+    for name, exporter in list(liveExports.items()):
+        exporter.close()
+        if exporter.error:
+            log(f"Live export to {exporter.path} failed: {exporter.error}", logLevels["ERROR"])
+        else:
+            log(f"Exported {exporter.rows} samples of {name} to {exporter.path}, {exporter.dropped} dropped")
+    liveExports.clear()
+
+def startExport(path, fields, chunks, what):
+    """Write chunks to `path` on a thread of its own and log how it went
+    """
+    def run():
+        try:
+            result = export.exportChunks(path, fields, chunks)
+        except (OSError, ValueError) as e:
+            log(f"Failed to export {what}: {e}", logLevels["ERROR"])
+            return
+        log(f"Exported {result['rows']} samples of {what} to {path} in {result['seconds']:.1f} s, "
+            f"{result['rows'] / max(result['seconds'], 1e-6):.0f} samples/s, {result['bytes'] / 1e6:.1f} MB")
+    Thread(target=run, daemon=True).start()
+
+def exportBuffer(source, path):
+    fields = list(mainSchema.names)
+    startExport(path, fields, export.bufferChunks(source.buffer, fields), f"the {source.name} buffer")
+
+def exportSession(recording, path):
+    fields = list(mainSchema.names)
+    chunks = export.sessionChunks(recording, mainSchema, fields, analysisParser(), address=rcvAddress)
+    startExport(path, fields + ["address"], chunks, recording)
+
+def startRecorder():
+    global recorder
+    if recorder or not recordDirectory:
+        return
+    recorder = session.SessionRecorder(recordDirectory, onError=lambda e: log(f"Recording stopped, nothing more is written: {e}", logLevels["WARN"]))
+    recorder.start()
+    log(f"Recording to {recorder.basePath}")
+
 def showSettingsMenu():
     settings = GeneralSettingsPopup()
 
 mapWidget = None
-mapPath = None
-positionLog = []
+graphContainer = None
+tilePrefetchThread = None
+# Totals of the last map tile prefetch, shown in the diagnostics counters
+tilePrefetchTotals = None
 def setRegion(region):
     selectedRegion = mapRegions[region]
     mapWidget.fit_bounding_box(selectedRegion[0], selectedRegion[1])
+    for source in sources.values():
+        source.laps.setGate(lapGates.get(region))
+
+def setTileServer(server, contact=None):
+    """Draw and prefetch map tiles from another server, tiles already stored for the old one stay in the database
+    """
+    global mapTileServer, mapTileContact
+    mapTileContact = contact
+    if server == mapTileServer:
+        return
+    mapTileServer = server
+    if mapWidget:
+        mapWidget.set_tile_server(mapTileServer, max_zoom=mapMaxZoom)
+    logTileCoverage()
+
+def logTileCoverage():
+    cache = tilecache.TileCache(mapTileDatabase, mapTileServer, mapMaxZoom)
+    try:
+        for name, corners in mapRegions.items():
+            stored, total = cache.coverage(corners, margin=mapTileMargin)
+            log(f"Map tiles for {name}: {stored}/{total} cached", logLevels["INFO"] if stored == total else logLevels["WARN"])
+    finally:
+        cache.close()
+
+def prefetchMapTiles():
+    """Download the tiles of every map region in the background, then redraw the map from the database
+    """
+    global tilePrefetchThread
+    if tilePrefetchThread and tilePrefetchThread.is_alive():
+        log("Map tile prefetch already running")
+        return
+    try:
+        tilecache.checkBulkAllowed(mapTileServer, mapTileContact)
+    except ValueError as e:
+        log(str(e), logLevels["ERROR"])
+        return
+    def run():
+        global tilePrefetchTotals
+        results = tilecache.prefetchRegions(mapTileDatabase, mapTileServer, mapRegions, mapMaxZoom, mapTileMargin, log,
+                                            mapTileContact)
+        fetchMs = sorted(ms for r in results.values() for ms in r["fetchMs"])
+        if fetchMs:
+            log(f"Map tile fetch latency p50 {fetchMs[len(fetchMs) // 2]:.0f} ms, max {fetchMs[-1]:.0f} ms")
+        # Tiles already in the database are cache hits, the rest had to be fetched
+        totals = {key: sum(r[key] for r in results.values()) for key in ("tiles", "stored", "fetched", "failed")}
+        tilePrefetchTotals = totals
+        if totals["tiles"]:
+            log(f"Map tile cache: {totals['stored']} hits, {totals['tiles'] - totals['stored']} misses "
+                f"({100 * totals['stored'] / totals['tiles']:.0f}% hit rate), {totals['failed']} still missing",
+                logLevels["INFO"] if not totals["failed"] else logLevels["WARN"])
+        logTileCoverage()
+        # Tiles that were blank before the prefetch are not cached by the widget, redraw them from the database
+        root.after(0, lambda: setRegion(region))
+    log(f"Prefetching map tiles into {mapTileDatabase}")
+    tilePrefetchThread = Thread(target=run, daemon=True)
+    tilePrefetchThread.start()
 
 def convertNmeaToDecimal(nmea_value):
     sign = -1 if nmea_value < 0 else 1
@@ -593,26 +2240,70 @@ def convertNmeaToDecimal(nmea_value):
 
     return sign * decimal
 
-def logPosition(lat, lon):
-    global mapPath
+def logPosition(trackLog, lat, lon, t):
     lat = convertNmeaToDecimal(lat)
     lon = -convertNmeaToDecimal(lon)
-    positionLog.append((lat,lon))
-    if len(positionLog) > 3:
-        mapPath = mapWidget.set_path(positionLog)
-        mapWidget.update()
-        mapWidget.update_idletasks()
-        positionLog.pop(0)
+    trackLog.append(lat, lon, t)
+    return lat, lon
+
+def drawPosition():
+    started = timings.start()
+    for source in sources.values():
+        if source.trackLayer:
+            source.trackLayer.draw()
+    timings.stop("map", started)
+
+# Buffer head of each source at the last graph frame
+screenHeads = {}
+def recordScreenLatency():
+    """Record how long ago the newest sample of every source with new data was received, now that it is drawn
+    """
+    now = time.monotonic()
+    for source in list(sources.values()):
+        buffer = source.buffer
+        if source.lastReceived is not None and buffer.head != screenHeads.get(source.name):
+            screenHeads[source.name] = buffer.head
+            timings.record("on screen", (now - source.lastReceived) * 1e6)
+
+def diagnosticsCounters():
+    """Per source, reader, recorder, publisher and map tile counters shown next to the stage timings
+    """
+    return {
+        "sources": {name: {"received": source.queue.received, "dropped": source.queue.dropped,
+                           "depth": source.queue.depth(), "late": timings.late.get(name, 0)}
+                    for name, source in list(sources.items())},
+        "readers": {port: {"unrouted": reader.unrouted} for port, reader in list(serialThreads.items())},
+        "recorder": {"recorded": recorder.recorded, "dropped": recorder.dropped,
+                     "error": str(recorder.error) if recorder.error else None} if recorder else None,
+        "publisher": {"subscribers": len(publisher.subscribers()),
+                      "dropped": sum(client.dropped for client in publisher.subscribers())} if publisher else None,
+        "exports": {name: {"rows": exporter.rows, "dropped": exporter.dropped} for name, exporter in list(liveExports.items())},
+        "tiles": tilePrefetchTotals,
+    }
 
 def main():
     def loadSettings(fn):
-        global port, region
+        global region
         with open(fn, 'r') as file:
             content = file.read()
         j = json.loads(content)
-        port = j["port"]
+        if "sources" in j:
+            configureSources(j["sources"])
+        elif "port" in j:
+            # Configs from before multiple sources only have the port of a single car
+            configureSources({next(iter(sourceConfig)): {"port": j["port"], "address": carLoraAddress}})
         region = j["region"]
+        for name, gate in j.get("lapGates", {}).items():
+            lapGates[name] = [tuple(point) for point in gate]
+        if "derived" in j:
+            setDerivedChannels(j["derived"])
         graphContainer.setSettings(j["graphs"])
+        if j.get("publishPort", publishPort) != publishPort:
+            startPublisher(j["publishPort"])
+        if "overviewSource" in j:
+            statContainer.setTelemetry(findSource(j["overviewSource"]))
+        if "mapTileServer" in j:
+            setTileServer(j["mapTileServer"], j.get("mapTileContact"))
         setRegion(region)
     def loadSettingsPopup():
         fn = filedialog.askopenfilename(filetypes=fileTypes)
@@ -620,21 +2311,58 @@ def main():
             return
         loadSettings(fn)
 
+    def replayPopup():
+        fn = filedialog.askopenfilename(filetypes=replayFileTypes)
+        if not fn:
+            return
+        replay = startReplay(fn)
+        if replay:
+            ReplayPopup(replay)
+
+    def analysisPopup():
+        fn = filedialog.askopenfilename(filetypes=analysisFileTypes)
+        if not fn:
+            return
+        source = openAnalysis(fn)
+        if source:
+            AnalysisPopup(source, graphContainer)
+
+    def exportBufferPopup():
+        fn = filedialog.asksaveasfilename(filetypes=exportFileTypes, defaultextension=exportFileTypes[0][1][1:])
+        if not fn:
+            return
+        exportBuffer(statContainer.telemetry, fn)
+
+    def exportSessionPopup():
+        recording = filedialog.askopenfilename(filetypes=replayFileTypes)
+        if not recording:
+            return
+        fn = filedialog.asksaveasfilename(filetypes=exportFileTypes, defaultextension=exportFileTypes[0][1][1:])
+        if not fn:
+            return
+        exportSession(recording, fn)
+
     def saveSettings():
         fn = filedialog.asksaveasfilename(filetypes=fileTypes)
         if fn is None:
             return
         j = {}
-        j["port"] = port
+        j["sources"] = sourceConfig
         j["graphs"] = graphContainer.getSettings()
+        j["overviewSource"] = statContainer.telemetry.name
+        j["publishPort"] = publishPort
+        j["mapTileServer"] = mapTileServer
+        j["mapTileContact"] = mapTileContact
         j["region"] = region
+        j["lapGates"] = lapGates
+        j["derived"] = derivedChannels
         with open(fn, 'w') as file:
             file.write(json.dumps(j))
-    global mainBuffer, serialThread, logInfo, statContainer, mapWidget, mapPath, root, mainFrame
-    mainBuffer = RollingBuffer(maxBufferLength)
-    # Initialize time buffer with expected time, to reduce the effect of outliers
-    for i in range(0, 100):
-        mainBuffer.add({"delta": expectedPacketDelay})
+    global mainSchema, logInfo, statContainer, graphContainer, mapWidget, root, mainFrame
+    mainSchema = FieldSchema(expectedFields)
+    if not setDerivedChannels(derivedChannels):
+        setDerivedChannels({})
+    configureSources(sourceConfig)
     root = tk.Tk()
     menubar = tk.Menu(root)
     root.config(menu=menubar)
@@ -644,6 +2372,10 @@ def main():
         label="Edit Settings",
         command=showSettingsMenu
     )
+    filemenu.add_command(
+        label="Diagnostics",
+        command=DiagnosticsPopup
+    )
     filemenu.add_command(
         label="Save Config",
         command=saveSettings
@@ -652,6 +2384,32 @@ def main():
         label="Load Config",
         command=loadSettingsPopup
     )
+    filemenu.add_command(
+        label="Replay Session",
+        command=replayPopup
+    )
+    filemenu.add_command(
+        label="Analyze Session",
+        command=analysisPopup
+    )
+    filemenu.add_command(
+        label="Export Buffer",
+        command=exportBufferPopup
+    )
+    filemenu.add_command(
+        label="Export Session",
+        command=exportSessionPopup
+    )
+    liveExportVar = tk.BooleanVar(root, value=liveExport)
+    filemenu.add_checkbutton(
+        label="Live Export",
+        variable=liveExportVar,
+        command=lambda: setLiveExport(liveExportVar.get())
+    )
+    filemenu.add_command(
+        label="Prefetch Map Tiles",
+        command=prefetchMapTiles
+    )
     filemenu.add_command(
         label="Quit",
         command=root.destroy
@@ -684,13 +2442,20 @@ def main():
     statColumn.grid(column=0,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
     statColumn.columnconfigure(0, weight=1)
     statColumn.rowconfigure(0,weight=1)
-    statContainer = StatOverviewContainer(statColumn, mainBuffer)
+    statContainer = StatOverviewContainer(statColumn, findSource(None))
     statContainer.grid(column=1,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
 
     logInfo = tk.Text(statColumn,height=8)
     logInfo.grid(column=0,row=0,sticky=(tk.N,tk.W,tk.E,tk.S))
-
-    mapWidget = tkintermapview.TkinterMapView(mainFrame, width=500)
+    logConsole.widget = logInfo
+    logConsole.setFile(logFile)
+    logTileCoverage()
+
+    mapWidget = tkintermapview.TkinterMapView(mainFrame, width=500, database_path=mapTileDatabase,
+                                              use_database_only=mapOfflineOnly, max_zoom=mapMaxZoom)
+    mapWidget.set_tile_server(mapTileServer, max_zoom=mapMaxZoom)
+    for source in sources.values():
+        source.showOn(mapWidget)
     mapWidget.grid(column=1,row=0,sticky=(tk.N,tk.W,tk.E,tk.S),rowspan=2)
     mapWidget.set_position(39.789184736877345, -86.23609137045648)
 
@@ -700,16 +2465,46 @@ def main():
     #     root.after(expectedPacketDelay, tick)
 
     def graphDrawTick():
+        started = timings.start()
         graphContainer.draw()
+        timings.stop("graphs", started)
+        if started is not None:
+            recordScreenLatency()
         root.after(displayRefreshDelay, graphDrawTick)
 
-    startSerialThread()
+    def statDrawTick():
+        started = timings.start()
+        statContainer.draw()
+        timings.stop("overview", started)
+        root.after(statRefreshDelay, statDrawTick)
+
+    def ingestDrainTick():
+        ingestTick()
+        root.after(ingestDrainDelay, ingestDrainTick)
+
+    def logFlushTick():
+        logConsole.flush()
+        root.after(logFlushDelay, logFlushTick)
+
+    startSerialThreads()
+    startPublisher(publishPort)
     # root.after(expectedPacketDelay, tick)
     root.after(displayRefreshDelay, graphDrawTick)
+    root.after(statRefreshDelay, statDrawTick)
+    root.after(ingestDrainDelay, ingestDrainTick)
+    root.after(logFlushDelay, logFlushTick)
     root.mainloop()
     global running
     running = False
-    serialThread.join()
+    for reader in serialThreads.values():
+        reader.stop()
+        reader.join()
+    if publisher:
+        publisher.close()
+    stopReplay()
+    setLiveExport(False)
+    if recorder:
+        recorder.close()
 
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ s = serial.Serial("COM8")
 
 with open("dummy.txt", "r") as f:
     for line in f.readlines():
-        s.write(line)
+        s.write(line.encode())
         print(line)
         time.sleep(0.2)
 
@@ -0,0 +1,279 @@
+"""On-disk session recordings of every raw line received from the modem.
+
+A recording is a series of parts, each a data file and an index file:
+
+    <name>-0001.rec   8 byte magic, then records of
+                      rxTime f64 (ms), length u32, raw line bytes
+    <name>-0001.idx   entries of first rxTime f64, offset u64, one per block
+
+A new index entry is written whenever at least `blockSize` bytes of records
+have been written since the previous one, so a reader can binary-search the
+index and start decoding close to any point in time without reading the file
+up to it. Both files are append-only and plain little endian structs, so they
+can be memory-mapped while the recorder is still writing.
+"""
+import bisect
+import glob
+import mmap
+import os
+import queue
+import struct
+import time
+from threading import Thread
+
+MAGIC = b"FSREC1\0\0"
+record = struct.Struct("<dI")
+indexEntry = struct.Struct("<dQ")
+
+class SessionRecorder(Thread):
+    """Writes raw lines to rotating session files from its own thread.
+
+    record() only queues the line, so the caller never waits on disk. Writes go
+    through a large userspace buffer and are flushed periodically, never fsynced.
+    A disk error is kept in `error` and passed to `onError` from this thread,
+    recording ends there and later lines count as dropped.
+    """
+    def __init__(self, directory, name=None, blockSize=64 * 1024, maxPartBytes=256 * 1024 * 1024,
+                 queueSize=100000, flushDelay=1.0, onError=None):
+        super().__init__(daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self.basePath = os.path.join(directory, name or time.strftime("session-%Y%m%d-%H%M%S"))
+        self.blockSize = blockSize
+        self.maxPartBytes = maxPartBytes
+        self.flushDelay = flushDelay
+        self.queue = queue.Queue(queueSize)
+        self.recorded = 0
+        self.dropped = 0
+        self.error = None
+        self.onError = onError
+        self.part = 0
+        self.data = None
+        self.index = None
+
+    def record(self, rxTime, line):
+        if self.error:
+            self.dropped += 1
+            return
+        try:
+            self.queue.put_nowait((rxTime, line))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # A recorder that failed has stopped reading the queue, so never wait for room in it
+        while self.is_alive():
+            try:
+                self.queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.join()
+
+    def _openPart(self):
+        self._closePart()
+        self.part += 1
+        path = f"{self.basePath}-{self.part:04d}"
+        self.data = open(path + ".rec", "wb", buffering=1024 * 1024)
+        self.index = open(path + ".idx", "wb", buffering=64 * 1024)
+        self.data.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.nextBlock = self.offset
+
+    def _closePart(self):
+        data, index = self.data, self.index
+        self.data = self.index = None
+        try:
+            if data:
+                data.close()
+        finally:
+            if index:
+                index.close()
+
+    def _write(self, rxTime, line):
+        if self.offset >= self.nextBlock:
+            if self.offset >= self.maxPartBytes:
+                self._openPart()
+            self.index.write(indexEntry.pack(rxTime, self.offset))
+            self.nextBlock = self.offset + self.blockSize
+        self.data.write(record.pack(rxTime, len(line)))
+        self.data.write(line)
+        self.offset += record.size + len(line)
+        self.recorded += 1
+
+    def run(self):
+        try:
+            self._openPart()
+            lastFlush = time.monotonic()
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flushDelay)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                if item:
+                    self._write(*item)
+                if time.monotonic() - lastFlush >= self.flushDelay:
+                    # Make recent data visible to readers, without paying for an fsync
+                    self.data.flush()
+                    self.index.flush()
+                    lastFlush = time.monotonic()
+        except OSError as e:
+            self.error = e
+            if self.onError:
+                self.onError(e)
+        finally:
+            try:
+                self._closePart()
+            except OSError as e:
+                self.error = self.error or e
+
+class IndexTimes():
+    """Sequence view of the block start times in an index mapping, for bisect
+    """
+    def __init__(self, buf):
+        self.buf = buf
+        self.count = len(buf) // indexEntry.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return indexEntry.unpack_from(self.buf, i * indexEntry.size)[0]
+
+class SessionReader():
+    """Memory-maps one part of a recording and seeks through it by time.
+
+    The index file is used if present, otherwise it is rebuilt by scanning the
+    records once, and written out if `saveIndex` is set.
+    """
+    def __init__(self, path, blockSize=64 * 1024, saveIndex=False):
+        base = path[:-4] if path.endswith((".rec", ".idx")) else path
+        self.file = open(base + ".rec", "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{base}.rec is not a session recording")
+        self.end = len(self.data)
+        try:
+            with open(base + ".idx", "rb") as f:
+                index = f.read()
+        except FileNotFoundError:
+            index = self._buildIndex(blockSize)
+            if saveIndex:
+                try:
+                    with open(base + ".idx", "wb") as f:
+                        f.write(index)
+                except OSError:
+                    pass
+        # Drop a trailing partial entry, or entries pointing past data not yet flushed by a live recorder
+        count = len(index) // indexEntry.size
+        while count and indexEntry.unpack_from(index, (count - 1) * indexEntry.size)[1] >= self.end:
+            count -= 1
+        self.index = index[:count * indexEntry.size]
+        self.times = IndexTimes(self.index)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _buildIndex(self, blockSize):
+        entries = []
+        nextBlock = len(MAGIC)
+        for rxTime, _, offset in self.records():
+            if offset >= nextBlock:
+                entries.append(indexEntry.pack(rxTime, offset))
+                nextBlock = offset + blockSize
+        return b"".join(entries)
+
+    def startTime(self):
+        return record.unpack_from(self.data, len(MAGIC))[0] if self.end > len(MAGIC) else None
+
+    def endTime(self):
+        """Receive time of the last record, found by scanning forward from the last block
+        """
+        last = None
+        start = indexEntry.unpack_from(self.index, len(self.index) - indexEntry.size)[1] if self.index else len(MAGIC)
+        for rxTime, _, _ in self.records(start):
+            last = rxTime
+        return last
+
+    def seek(self, t):
+        """Offset of the first record received at or after t (ms)
+        """
+        block = bisect.bisect_right(self.times, t) - 1
+        start = indexEntry.unpack_from(self.index, block * indexEntry.size)[1] if block >= 0 else len(MAGIC)
+        for rxTime, _, offset in self.records(start):
+            if rxTime >= t:
+                return offset
+        return self.end
+
+    def records(self, offset=len(MAGIC), end=None):
+        """Iterate (rxTime, line, offset) from a record offset up to `end`, stopping at a partially written record
+        """
+        data = self.data
+        size = self.end
+        end = size if end is None else min(end, size)
+        while offset < end and offset + record.size <= size:
+            rxTime, length = record.unpack_from(data, offset)
+            start = offset + record.size
+            if start + length > size:
+                break
+            yield rxTime, data[start:start + length], offset
+            offset = start + length
+
+def sessionParts(path):
+    """All part files belonging to the recording `path` is a part of, in order
+    """
+    base = path[:-4] if path.endswith((".rec", ".idx")) else path
+    base = base.rsplit("-", 1)[0]
+    return sorted(glob.glob(glob.escape(base) + "-[0-9][0-9][0-9][0-9].rec"))
+
+class SessionPlayback():
+    """A whole recording, or a plain text capture such as dummy.txt, as one time ordered stream.
+
+    Text captures have no receive times, so their lines are spaced `textDelay` ms apart.
+    """
+    def __init__(self, path, textDelay=50):
+        self.readers = []
+        self.lines = None
+        self.textDelay = textDelay
+        if path.endswith(".rec"):
+            self.readers = [SessionReader(p) for p in sessionParts(path) or [path]]
+        else:
+            with open(path, "rb") as f:
+                self.lines = [line for line in f if line.strip()]
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+
+    def startTime(self):
+        if self.lines is not None:
+            return 0
+        return self.readers[0].startTime() or 0
+
+    def endTime(self):
+        if self.lines is not None:
+            return max(len(self.lines) - 1, 0) * self.textDelay
+        return self.readers[-1].endTime() or self.startTime()
+
+    def records(self, since=None):
+        """Iterate (rxTime, line) from the first record received at or after `since` (ms)
+        """
+        if self.lines is not None:
+            first = 0 if since is None else max(0, -int(-since // self.textDelay))
+            for i in range(first, len(self.lines)):
+                yield i * self.textDelay, self.lines[i]
+            return
+        for i, reader in enumerate(self.readers):
+            if since is not None:
+                # Skip whole parts that end before the seek point
+                following = self.readers[i + 1].startTime() if i + 1 < len(self.readers) else None
+                if following is not None and following <= since:
+                    continue
+                offset = reader.seek(since)
+                since = None
+            else:
+                offset = len(MAGIC)
+            for rxTime, line, _ in reader.records(offset):
+                yield rxTime, line
@@ -0,0 +1,101 @@
+"""Compact binary telemetry frames, shared by the car side, gendummy.py and main.py.
+
+Frame layout (little endian):
+    magic    u8   0xA5, never the first byte of a TELEM text packet
+    version  u8
+    seq      u16  packet counter, wraps around
+    bitmap   u16  bit n set means field n of `fields` is present
+    values        one packed value per present field, in field order
+    crc      u16  CRC-16/CCITT (crc_hqx, init 0xFFFF) over everything before it
+
+Each value is stored as round(value * scale) in its struct type, clamped to the
+type's range, or as a float32 when the scale is None.
+"""
+import binascii
+import struct
+
+MAGIC = 0xA5
+VERSION = 1
+
+# (name, struct code, scale), index is the bitmap bit. At most 16 entries.
+fields = [
+    ("FUEL", "H", 100),
+    ("RPM", "H", 1),
+    ("Speed", "H", 100),
+    ("Slope", "h", 100),
+    ("BV", "H", 1000),
+    ("Throttle", "H", 100),
+    ("OXY", "f", None),
+    ("INJ", "f", None),
+    # NMEA ddmm.mmmm, a float32 would lose the last digits
+    ("LAT", "i", 10000),
+    ("LON", "i", 10000),
+    ("ACCX", "h", 1000),
+    ("ACCY", "h", 1000),
+    ("ACCZ", "h", 1000),
+]
+
+header = struct.Struct("<BBHH")
+crc = struct.Struct("<H")
+fieldIndex = {name: i for i, (name, _, _) in enumerate(fields)}
+typeRanges = {
+    "h": (-0x8000, 0x7FFF),
+    "H": (0, 0xFFFF),
+    "i": (-0x80000000, 0x7FFFFFFF),
+}
+# Struct for every bitmap value is built on first use
+valueStructs = {}
+
+def _valueStruct(bitmap):
+    s = valueStructs.get(bitmap)
+    if s is None:
+        codes = "".join(code for i, (_, code, _) in enumerate(fields) if bitmap & (1 << i))
+        s = valueStructs[bitmap] = struct.Struct("<" + codes)
+    return s
+
+def isFrame(payload):
+    return len(payload) > 0 and payload[0] == MAGIC
+
+def encodeFrame(values, seq):
+    """Encode a {field: value} dict, fields without a slot in `fields` are skipped
+    """
+    bitmap = 0
+    for name in values:
+        idx = fieldIndex.get(name)
+        if idx is not None and values[name] is not None:
+            bitmap |= 1 << idx
+    packed = []
+    for i, (name, code, scale) in enumerate(fields):
+        if not bitmap & (1 << i):
+            continue
+        value = values[name]
+        if scale is not None:
+            lo, hi = typeRanges[code]
+            value = min(max(round(value * scale), lo), hi)
+        packed.append(value)
+    body = header.pack(MAGIC, VERSION, seq & 0xFFFF, bitmap) + _valueStruct(bitmap).pack(*packed)
+    return body + crc.pack(binascii.crc_hqx(body, 0xFFFF))
+
+def decodeFrame(payload):
+    """Decode a frame into (seq, {field: value}), or None if it is truncated, corrupt or an unknown version
+    """
+    if len(payload) < header.size + crc.size or payload[0] != MAGIC:
+        return None
+    _, version, seq, bitmap = header.unpack_from(payload)
+    if version != VERSION:
+        return None
+    body = _valueStruct(bitmap)
+    end = header.size + body.size
+    if len(payload) != end + crc.size:
+        return None
+    if crc.unpack_from(payload, end)[0] != binascii.crc_hqx(payload[:end], 0xFFFF):
+        return None
+    values = {}
+    raw = body.unpack_from(payload, header.size)
+    n = 0
+    for i, (name, _, scale) in enumerate(fields):
+        if bitmap & (1 << i):
+            value = raw[n]
+            values[name] = value / scale if scale is not None else value
+            n += 1
+    return seq, values
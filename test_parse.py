@@ -0,0 +1,58 @@
+"""Packet parsing: every field of a packed line comes back, in every parser
+"""
+import math
+
+import gendummy
+import main
+
+def packed(fieldCount=20):
+    data = {name: round(value, 2) for name, value in gendummy.getWideDummyData(fieldCount).items()}
+    return data, gendummy.packLora(data)
+
+def test_parseLoraRowKeepsLastField():
+    schema = main.FieldSchema(main.expectedFields)
+    for _ in range(50):
+        data, line = packed()
+        row = main.parseLoraRow(line, schema)
+        assert {name: row[schema.index[name]] for name in data} == data
+
+def test_parseLoraPacketKeepsLastField():
+    for _ in range(50):
+        data, line = packed()
+        assert main.parseLoraPacket(line) == data
+        assert main.parseLoraPacket(line.decode()) == data
+
+def test_textLineEndings():
+    schema = main.FieldSchema(main.expectedFields)
+    data = {"RPM": 1500.0, "BV": 12.1}
+    for ending in (b"", b"\n", b"\r\n"):
+        line = gendummy.pack(data).strip().encode() + ending
+        row = main.parsePacketRow(line, schema)
+        assert row[schema.index["RPM"]] == 1500.0 and row[schema.index["BV"]] == 12.1
+
+def test_rssiNotParsedAsValue():
+    schema = main.FieldSchema(main.expectedFields)
+    payload = b"TELEM1;RPM=900.00;BV=12"
+    line = b"+RCV=101,%d,%s,-40,12\r\n" % (len(payload), payload)
+    row = main.parseLoraRow(line, schema)
+    assert row[schema.index["BV"]] == 12.0
+    assert math.isnan(row[schema.index["Speed"]])
+
+def test_badHeader():
+    schema = main.FieldSchema(main.expectedFields)
+    assert main.parseLoraRow(b"+RCV=101,x,TELEM1;RPM=1\r\n", schema) is None
+    assert main.parseLoraPacket("+RCV=101\r\n") is None
+
+def test_framerDropsRunawayLine():
+    framer = main.LineFramer(maxLength=100)
+    good = gendummy.packLora({"RPM": 900.0, "BV": 12.1})
+    lines = []
+    # Noise with no newline, fed a byte at a time, then lines again
+    for byte in bytes(range(256)) * 4:
+        if byte != ord("\n"):
+            lines += framer.feed(bytes([byte]))
+        assert len(framer.pending) <= 101
+    lines += framer.feed(b"tail of the noise\n" + good + good[:10])
+    lines += framer.feed(good[10:])
+    assert lines == [good, good]
+    assert framer.discarded == 255 * 4 + len(b"tail of the noise\n")
@@ -0,0 +1,75 @@
+"""WindowStats and RollingBuffer min/avg/max against a brute-force rescan of the live window
+"""
+import math
+import random
+from collections import deque
+
+import numpy as np
+
+import main
+
+def rescan(values):
+    values = [v for v in values if v == v]
+    if not values:
+        return None, None, None
+    return min(values), float(np.mean(values)), max(values)
+
+def check(stats, values):
+    lo, avg, hi = rescan(values)
+    assert stats[0] == lo
+    assert stats[2] == hi
+    if avg is None:
+        assert stats[1] is None
+    else:
+        assert math.isclose(stats[1], avg, rel_tol=1e-9, abs_tol=1e-9)
+
+def test_windowStatsRandomPushEvict():
+    rng = random.Random(1)
+    stats = main.WindowStats()
+    window = deque()
+    seq = 0
+    for _ in range(20000):
+        # Grow and shrink the window at random, with plenty of repeated values
+        if window and rng.random() < 0.45:
+            stats.evict(*window.popleft())
+        else:
+            value = float(rng.randint(-20, 20)) if rng.random() < 0.5 else rng.uniform(-1e3, 1e3)
+            stats.push(seq, value)
+            window.append((seq, value))
+            seq += 1
+        check((stats.getMin(), stats.getAvg(), stats.getMax()), [v for _, v in window])
+
+def test_rollingBufferMatchesWindow():
+    rng = random.Random(2)
+    size = 64
+    buffer = main.RollingBuffer(size, main.FieldSchema(["RPM", "BV"]))
+    rows = []
+    for n in range(3000):
+        # Missing samples and long runs without a field exercise eviction of NaN slots
+        rpm = math.nan if rng.random() < 0.2 else rng.uniform(0, 3000)
+        bv = math.nan if (n // 200) % 2 else float(rng.randint(10, 14))
+        buffer.addRow([rpm, bv], 1000.0 + n * 50)
+        rows.append((rpm, bv))
+        live = rows[-size:]
+        for idx, key in enumerate(("RPM", "BV")):
+            column = [row[idx] for row in live]
+            check((buffer.getMin(key), buffer.getAvg(key), buffer.getMax(key)), column)
+            assert np.array_equal(buffer.get(key), np.array(column), equal_nan=True)
+
+def test_unknownField():
+    buffer = main.RollingBuffer(8, main.FieldSchema(["RPM"]))
+    buffer.addRow([1.0], 0)
+    assert buffer.getMin("BV") is None and buffer.getAvg("BV") is None and buffer.getMax("BV") is None
+
+def test_envelopeUsesCallerClock():
+    # A replay far in the past still gets a tier with at least minBuckets buckets in its window
+    buffer = main.RollingBuffer(100000, main.FieldSchema(["RPM"]))
+    start = 1e12
+    for n in range(60000):
+        buffer.addRow([float(n % 100)], start + n * 10)
+    now = start + 60000 * 10
+    since = now - 300000
+    raw, _ = buffer.getWindow("RPM", since)
+    times, values = buffer.getEnvelope("RPM", since, now, 100)
+    assert 2 * 100 <= len(times) < len(raw)
+    assert values.min() == 0 and values.max() == 99
@@ -0,0 +1,102 @@
+"""Binary telemetry frames: round trips, damaged frames, and frames mixed with TELEM text lines
+"""
+import math
+import random
+
+import numpy as np
+
+import gendummy
+import main
+import telemframe
+
+def randomValues(rng):
+    values = {}
+    for name, code, scale in telemframe.fields:
+        if rng.random() < 0.3:
+            continue
+        if scale is None:
+            values[name] = rng.uniform(-1e4, 1e4)
+        else:
+            lo, hi = telemframe.typeRanges[code]
+            values[name] = rng.uniform(lo, hi) / scale
+    return values
+
+def assertClose(decoded, values):
+    assert decoded.keys() == values.keys()
+    for name, code, scale in telemframe.fields:
+        if name not in values:
+            continue
+        if scale is None:
+            assert decoded[name] == float(np.float32(values[name]))
+        else:
+            assert abs(decoded[name] - values[name]) <= 0.5 / scale + 1e-9
+
+def rcvLine(payload, address=101):
+    return b"+RCV=%d,%d,%s,-40,12\r\n" % (address, len(payload), payload)
+
+def test_roundTrip():
+    rng = random.Random(1)
+    for n in range(2000):
+        values = randomValues(rng)
+        seq, decoded = telemframe.decodeFrame(telemframe.encodeFrame(values, n))
+        assert seq == n & 0xFFFF
+        assertClose(decoded, values)
+
+def test_outOfRangeClamped():
+    _, decoded = telemframe.decodeFrame(telemframe.encodeFrame({"RPM": 1e9, "Slope": -1e9}, 0))
+    assert decoded == {"RPM": 0xFFFF, "Slope": -0x8000 / 100}
+
+def test_truncatedAndCorrupt():
+    rng = random.Random(2)
+    for n in range(200):
+        frame = telemframe.encodeFrame(randomValues(rng), n)
+        for length in range(len(frame)):
+            assert telemframe.decodeFrame(frame[:length]) is None
+        assert telemframe.decodeFrame(frame + b"\x00") is None
+        # Any single flipped bit after the magic byte is caught by the CRC or the length check
+        for bit in range(8, len(frame) * 8):
+            damaged = bytearray(frame)
+            damaged[bit // 8] ^= 1 << (bit % 8)
+            assert telemframe.decodeFrame(bytes(damaged)) is None
+    assert telemframe.decodeFrame(b"") is None
+    assert telemframe.decodeFrame(b"TELEM1;RPM=1") is None
+
+def test_corruptFrameNotParsedAsText():
+    schema = main.FieldSchema(main.expectedFields)
+    frame = bytearray(telemframe.encodeFrame({"RPM": 1200}, 1))
+    frame[-1] ^= 0xFF
+    assert main.parseLoraRow(rcvLine(bytes(frame)), schema) is None
+
+def test_framesMixedWithText():
+    rng = random.Random(3)
+    schema = main.FieldSchema(main.expectedFields)
+    lines = []
+    expected = []
+    for n in range(500):
+        if rng.random() < 0.5:
+            values = randomValues(rng)
+            # Newlines inside a binary payload must not split the line
+            values["RPM"] = float(ord("\n"))
+            lines.append(rcvLine(telemframe.encodeFrame(values, n)))
+            expected.append((True, values))
+        else:
+            values = {name: round(value, 2) for name, value in gendummy.getDummyData().items()}
+            lines.append(gendummy.packLora(values))
+            expected.append((False, values))
+    stream = b"".join(lines)
+    framer = main.LineFramer()
+    received = []
+    start = 0
+    while start < len(stream):
+        size = rng.randint(1, 64)
+        received.extend(framer.feed(stream[start:start + size]))
+        start += size
+    assert received == lines
+    for line, (isFrame, values) in zip(received, expected):
+        row = main.parseLoraRow(line, schema)
+        decoded = {name: row[schema.index[name]] for name in values}
+        if isFrame:
+            assertClose(decoded, values)
+        else:
+            assert decoded == values
+        assert all(math.isnan(v) for i, v in enumerate(row) if schema.names[i] not in values)
@@ -0,0 +1,203 @@
+"""Offline map tiles for the regions the map can be set to.
+
+Tiles are kept in the SQLite layout tkintermapview's OfflineLoader writes, so a
+TkinterMapView created with the same database_path and use_database_only=True
+draws them without ever going to the network:
+
+    server    url, max_zoom
+    tiles     zoom, x, y, server, tile_image
+    sections  position_a, position_b, zoom_a, zoom_b, server
+
+Run `python tilecache.py` while online to prefetch every region in main.mapRegions.
+
+Prefetching is a bulk download, which the usage policy of the public
+OpenStreetMap tile servers forbids. Point main.mapTileServer at a server that
+allows it (a commercial plan, or one you host), and set main.mapTileContact so
+the operator can reach you. Requests identify themselves with that contact and
+never run more than `maxWorkers` at once.
+"""
+import math
+import sqlite3
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from tkintermapview.utility_functions import decimal_to_osm
+
+userAgent = "Field-Side tile prefetch"
+# Parallel downloads allowed whatever a caller asks for
+maxWorkers = 2
+# Tile servers whose usage policy forbids bulk downloads for offline use
+bulkForbidden = ("tile.openstreetmap.org",)
+
+def checkBulkAllowed(server, contact):
+    """Raise ValueError unless `server` may be prefetched from and there is a contact to send with the requests
+    """
+    host = urlsplit(server).hostname or ""
+    if any(host == forbidden or host.endswith("." + forbidden) for forbidden in bulkForbidden):
+        raise ValueError(f"The usage policy of {host} forbids bulk downloads, set mapTileServer to a tile server that allows them")
+    if not contact:
+        raise ValueError("Set mapTileContact to an e-mail address or URL, tile servers need a way to reach whoever downloads in bulk")
+
+def regionTiles(corners, zoom, margin=0):
+    """(x, y) of every tile covering a bounding box at one zoom level, plus `margin` tiles around it
+    """
+    (latA, lonA), (latB, lonB) = corners
+    x0, y0 = decimal_to_osm(max(latA, latB), min(lonA, lonB), zoom)
+    x1, y1 = decimal_to_osm(min(latA, latB), max(lonA, lonB), zoom)
+    last = 2 ** zoom - 1
+    xs = range(max(math.floor(x0) - margin, 0), min(math.floor(x1) + margin, last) + 1)
+    ys = range(max(math.floor(y0) - margin, 0), min(math.floor(y1) + margin, last) + 1)
+    return [(x, y) for x in xs for y in ys]
+
+class TileCache():
+    """Tile database for one tile server.
+
+    get() is the lookup the map widget does and counts hits and misses.
+    prefetch() downloads whatever a region is missing from a small thread pool,
+    retrying each tile a bounded number of times, and inserts the results in
+    batches from the calling thread.
+    """
+    def __init__(self, path, server, maxZoom=19, contact=None):
+        self.path = path
+        self.server = server
+        self.maxZoom = maxZoom
+        self.userAgent = f"{userAgent} ({contact})" if contact else userAgent
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS server (
+                               url VARCHAR(300) PRIMARY KEY NOT NULL,
+                               max_zoom INTEGER NOT NULL);""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS tiles (
+                               zoom INTEGER NOT NULL,
+                               x INTEGER NOT NULL,
+                               y INTEGER NOT NULL,
+                               server VARCHAR(300) NOT NULL,
+                               tile_image BLOB NOT NULL,
+                               CONSTRAINT fk_server FOREIGN KEY (server) REFERENCES server (url),
+                               CONSTRAINT pk_tiles PRIMARY KEY (zoom, x, y, server));""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS sections (
+                               position_a VARCHAR(100) NOT NULL,
+                               position_b VARCHAR(100) NOT NULL,
+                               zoom_a INTEGER NOT NULL,
+                               zoom_b INTEGER NOT NULL,
+                               server VARCHAR(300) NOT NULL,
+                               CONSTRAINT fk_server FOREIGN KEY (server) REFERENCES server (url),
+                               CONSTRAINT pk_tiles PRIMARY KEY (position_a, position_b, zoom_a, zoom_b, server));""")
+        self.db.execute("INSERT OR IGNORE INTO server (url, max_zoom) VALUES (?, ?);", (server, maxZoom))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def get(self, zoom, x, y):
+        """Stored image bytes of a tile, or None
+        """
+        row = self.db.execute("SELECT tile_image FROM tiles WHERE zoom=? AND x=? AND y=? AND server=?;",
+                              (zoom, x, y, self.server)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else float("nan")
+
+    def missing(self, corners, minZoom=0, maxZoom=None, margin=0):
+        """(zoom, x, y) of every tile of a region that is not stored yet
+        """
+        tiles = []
+        for zoom in range(minZoom, (self.maxZoom if maxZoom is None else maxZoom) + 1):
+            stored = set(self.db.execute("SELECT x, y FROM tiles WHERE zoom=? AND server=?;", (zoom, self.server)))
+            tiles.extend((zoom, x, y) for x, y in regionTiles(corners, zoom, margin) if (x, y) not in stored)
+        return tiles
+
+    def coverage(self, corners, minZoom=0, maxZoom=None, margin=0):
+        """(stored, total) tile counts for a region
+        """
+        maxZoom = self.maxZoom if maxZoom is None else maxZoom
+        total = sum(len(regionTiles(corners, zoom, margin)) for zoom in range(minZoom, maxZoom + 1))
+        return total - len(self.missing(corners, minZoom, maxZoom, margin)), total
+
+    def _fetch(self, tile, timeout, retries):
+        zoom, x, y = tile
+        url = self.server.replace("{z}", str(zoom)).replace("{x}", str(x)).replace("{y}", str(y))
+        request = urllib.request.Request(url, headers={"User-Agent": self.userAgent})
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    return tile, response.read(), (time.perf_counter() - start) * 1000
+            except OSError:
+                if attempt < retries:
+                    time.sleep(0.5 * (attempt + 1))
+        return tile, None, None
+
+    def prefetch(self, corners, minZoom=0, maxZoom=None, margin=0, workers=maxWorkers, timeout=10, retries=2,
+                 batchSize=100, progress=None):
+        """Download every missing tile of a region.
+
+        Returns {"tiles", "stored", "fetched", "failed", "fetchMs"} where stored
+        counts tiles that were already in the database and fetchMs holds the
+        download time of each fetched tile. `progress(done, todo)` is called after
+        every batch.
+        """
+        maxZoom = self.maxZoom if maxZoom is None else maxZoom
+        todo = self.missing(corners, minZoom, maxZoom, margin)
+        total = sum(len(regionTiles(corners, zoom, margin)) for zoom in range(minZoom, maxZoom + 1))
+        fetchMs = []
+        failed = 0
+        batch = []
+        done = 0
+        with ThreadPoolExecutor(min(workers, maxWorkers)) as pool:
+            for tile, data, ms in pool.map(lambda tile: self._fetch(tile, timeout, retries), todo):
+                done += 1
+                if data is None:
+                    failed += 1
+                else:
+                    fetchMs.append(ms)
+                    batch.append((*tile, self.server, data))
+                if len(batch) >= batchSize or done == len(todo):
+                    self.db.executemany("INSERT OR REPLACE INTO tiles (zoom, x, y, server, tile_image) VALUES (?, ?, ?, ?, ?);", batch)
+                    self.db.commit()
+                    batch = []
+                    if progress:
+                        progress(done, len(todo))
+        if not failed:
+            self.db.execute("INSERT OR IGNORE INTO sections (position_a, position_b, zoom_a, zoom_b, server) VALUES (?, ?, ?, ?, ?);",
+                            (str(corners[0]), str(corners[1]), minZoom, maxZoom, self.server))
+            self.db.commit()
+        return {"tiles": total, "stored": total - len(todo), "fetched": len(fetchMs), "failed": failed, "fetchMs": fetchMs}
+
+def prefetchRegions(path, server, regions, maxZoom=19, margin=0, log=print, contact=None):
+    """Prefetch every region of a {name: corners} dict, returns {name: prefetch() result}.
+
+    Raises ValueError if the server does not allow bulk downloads or there is no contact, see checkBulkAllowed.
+    """
+    checkBulkAllowed(server, contact)
+    cache = TileCache(path, server, maxZoom, contact)
+    results = {}
+    try:
+        for name, corners in regions.items():
+            result = results[name] = cache.prefetch(corners, margin=margin,
+                                                    progress=lambda done, todo: log(f"{name}: {done}/{todo} tiles"))
+            log(f"{name}: {result['stored']} of {result['tiles']} tiles were cached, "
+                f"fetched {result['fetched']}, failed {result['failed']}")
+    finally:
+        cache.close()
+    return results
+
+if __name__ == "__main__":
+    import main
+    try:
+        results = prefetchRegions(main.mapTileDatabase, main.mapTileServer, main.mapRegions, main.mapMaxZoom,
+                                  main.mapTileMargin, contact=main.mapTileContact)
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    sys.exit(1 if any(r["failed"] for r in results.values()) else 0)
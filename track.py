@@ -0,0 +1,162 @@
+"""GPS track of a session, kept in compact arrays and drawn on a TkinterMapView.
+
+TrackLog holds every position received. TrackLayer draws it with a bounded
+number of canvas points: only the newest chunk of the track is redrawn as
+positions arrive, older chunks are simplified once and then left alone.
+"""
+import math
+
+import numpy as np
+
+# Metres per degree of latitude, and of longitude at the equator
+metresPerDegree = 111320.0
+
+def simplify(lat, lon, tolerance):
+    """Indices of the points Douglas-Peucker keeps for a polyline, tolerance in metres
+    """
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    # Local equirectangular projection, plenty for a circuit sized track
+    x = (lon - lon[0]) * metresPerDegree * math.cos(math.radians(lat[0]))
+    y = (lat - lat[0]) * metresPerDegree
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx = x[b] - x[a]
+        dy = y[b] - y[a]
+        px = x[a + 1:b] - x[a]
+        py = y[a + 1:b] - y[a]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            # Closed loop, fall back to the distance from the shared end point
+            distance = np.hypot(px, py)
+        else:
+            distance = np.abs(px * dy - py * dx) / length
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance:
+            mid = a + 1 + i
+            keep[mid] = True
+            stack.append((a, mid))
+            stack.append((mid, b))
+    return np.flatnonzero(keep)
+
+class TrackLog():
+    """Every position of a session in growable float64 arrays, in decimal degrees
+    """
+    def __init__(self, capacity=4096):
+        self.lat = np.empty(capacity)
+        self.lon = np.empty(capacity)
+        self.times = np.empty(capacity)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, lat, lon, t):
+        if self.length == len(self.lat):
+            capacity = 2 * len(self.lat)
+            for name in ("lat", "lon", "times"):
+                grown = np.empty(capacity)
+                grown[:self.length] = getattr(self, name)[:self.length]
+                setattr(self, name, grown)
+        self.lat[self.length] = lat
+        self.lon[self.length] = lon
+        self.times[self.length] = t
+        self.length += 1
+
+    def positions(self, start=0, end=None):
+        """(lat, lon) tuples from start to end, as the map widget takes them
+        """
+        end = self.length if end is None else min(end, self.length)
+        return list(zip(self.lat[start:end].tolist(), self.lon[start:end].tolist()))
+
+class TrackLayer():
+    """Draws a TrackLog on a map widget.
+
+    The track is split into chunks of `chunkSize` positions. The newest chunk is
+    one path that is updated as positions arrive. A full chunk is simplified with
+    Douglas-Peucker at `tolerance` metres and frozen as its own path, which only
+    the widget touches again when it pans or zooms. If the frozen paths hold more
+    than `maxPoints` points together, they are merged and simplified again at
+    twice the tolerance, so the cost of drawing stays bounded however long the
+    session runs.
+    """
+    def __init__(self, mapWidget, track, chunkSize=500, tolerance=1.0, maxPoints=5000, color="#3E69CB", width=4):
+        self.mapWidget = mapWidget
+        self.track = track
+        self.chunkSize = chunkSize
+        self.tolerance = tolerance
+        self.maxPoints = maxPoints
+        self.color = color
+        self.width = width
+        # (lat, lon, path) of every frozen chunk, consecutive chunks share their end points
+        self.frozen = []
+        self.frozenPoints = 0
+        self.chunkStart = 0
+        self.tail = None
+        self.drawn = 0
+
+    def _path(self, positions):
+        return self.mapWidget.set_path(positions, color=self.color, width=self.width)
+
+    def _freeze(self, start, end):
+        lat = self.track.lat[start:end]
+        lon = self.track.lon[start:end]
+        keep = simplify(lat, lon, self.tolerance)
+        lat = lat[keep]
+        lon = lon[keep]
+        self.frozen.append((lat, lon, self._path(list(zip(lat.tolist(), lon.tolist())))))
+        self.frozenPoints += len(keep)
+        while self.frozenPoints > self.maxPoints and len(self.frozen) > 1:
+            self._merge()
+
+    def _merge(self):
+        self.tolerance *= 2
+        lat = np.concatenate([self.frozen[0][0]] + [chunk[0][1:] for chunk in self.frozen[1:]])
+        lon = np.concatenate([self.frozen[0][1]] + [chunk[1][1:] for chunk in self.frozen[1:]])
+        for _, _, path in self.frozen:
+            path.delete()
+        keep = simplify(lat, lon, self.tolerance)
+        lat = lat[keep]
+        lon = lon[keep]
+        self.frozen = [(lat, lon, self._path(list(zip(lat.tolist(), lon.tolist()))))]
+        self.frozenPoints = len(keep)
+
+    def delete(self):
+        """Remove the whole track from the map
+        """
+        for _, _, path in self.frozen:
+            path.delete()
+        if self.tail:
+            self.tail.delete()
+        self.frozen = []
+        self.frozenPoints = 0
+        self.tail = None
+
+    def pointCount(self):
+        """Points currently on the canvas
+        """
+        return self.frozenPoints + len(self.track) - self.chunkStart
+
+    def draw(self):
+        """Draw positions appended since the last call, meant to run at most once per UI frame
+        """
+        length = len(self.track)
+        if length == self.drawn:
+            return
+        while length - self.chunkStart > self.chunkSize:
+            end = self.chunkStart + self.chunkSize
+            self._freeze(self.chunkStart, end + 1)
+            self.chunkStart = end
+        positions = self.track.positions(self.chunkStart, length)
+        if len(positions) >= 2:
+            if self.tail:
+                self.tail.set_position_list(positions)
+            else:
+                self.tail = self._path(positions)
+        self.drawn = length